@@ -1,8 +1,12 @@
 import os
-import shutil
+import time
 from pathlib import Path
 import sys
 import subprocess
+import threading
+
+# start of the launch, reported once the first window is painted
+_START_TIME = time.perf_counter()
 
 # auto-setup venv and installs packages
 venv_path = Path(__file__).parent / ".venv"
@@ -13,21 +17,74 @@ if not venv_path.exists():
 
 os.environ.setdefault("QT_MULTIMEDIA_PREFERRED_PLUGINS", "windowsmediafoundation")
 
-from PyQt5.QtWidgets import *
+from PyQt5.QtWidgets import (
+	QApplication,
+	QCheckBox,
+	QComboBox,
+	QDoubleSpinBox,
+	QFileDialog,
+	QHBoxLayout,
+	QLabel,
+	QLineEdit,
+	QMainWindow,
+	QMessageBox,
+	QProgressBar,
+	QPushButton,
+	QSizePolicy,
+	QSpinBox,
+	QStackedWidget,
+	QTextEdit,
+	QVBoxLayout,
+	QWidget,
+	QWIDGETSIZE_MAX,)
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QMovie
 from PyQt5.QtGui import QPixmap
 
-try:
-	from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-	from PyQt5.QtMultimediaWidgets import QVideoWidget
-	_HAS_QT_MULTIMEDIA = True
-except Exception:
-	_HAS_QT_MULTIMEDIA = False
+# QtMultimedia, numpy, PIL, imageio and the glitch engines are imported on first use,
+# loadMultimedia() fills these in the first time an MP4 is previewed
+_HAS_QT_MULTIMEDIA = None
+QMediaPlayer = QMediaContent = QVideoWidget = None
+
+# modules imported in the background once the window is showing, set GLITCHER_PREWARM=0 to skip
+_PREWARM_MODULES = ["modules.BMP", "modules.JPEG", "modules.GIF", "modules.PNG", "modules.probe", "modules.MP4"]
+
+
+# glitch types offered in the dropdown for each file type
+_GLITCH_TYPES = {
+	".gif": ["BMP", "JPEG", "LZW", "Palette"],
+	".mp4": ["BMP", "JPEG", "H264", "Datamosh"],
+	".png": ["BMP", "PNG"],
+	".bmp": ["BMP"],
+	".jpg": ["JPEG"],
+	".jpeg": ["JPEG"],}
+_DEFAULT_GLITCH_TYPES = ["BMP", "JPEG"]
+
+
+def loadMultimedia():
+	# imports QtMultimedia once, returns False when it isn't available
+	global _HAS_QT_MULTIMEDIA, QMediaPlayer, QMediaContent, QVideoWidget
+	if _HAS_QT_MULTIMEDIA is None:
+		try:
+			from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
+			from PyQt5.QtMultimediaWidgets import QVideoWidget
+			_HAS_QT_MULTIMEDIA = True
+		except Exception:
+			_HAS_QT_MULTIMEDIA = False
+	return _HAS_QT_MULTIMEDIA
+
 
-from modules.JPEG import glitchJpeg
-from modules.BMP import convertFileToBMP, glitchBMP
-from modules.GIF import glitchGif, glitchGifWithJPEG
+def prewarm():
+	# imports the glitch engines on a background thread so the first glitch doesn't pay for it
+	def run():
+		for name in _PREWARM_MODULES:
+			try:
+				__import__(name)
+			except Exception:
+				pass
+	thread = threading.Thread(target=run, name="glitcher-prewarm", daemon=True)
+	thread.start()
+	return thread
 
 
 class GlitcherWindow(QMainWindow):
@@ -77,31 +134,9 @@ class GlitcherWindow(QMainWindow):
 		self.imageLabel.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 		self.previewStack.addWidget(self.imageLabel)
 
+		# the video player is only built when an MP4 is previewed, see createVideoPreview
 		self.videoWidget = None
 		self.mediaPlayer = None
-		if _HAS_QT_MULTIMEDIA:
-			self.videoWidget = QVideoWidget(self.previewStack)
-			self.videoWidget.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-			try:
-				if hasattr(self.videoWidget, "setAspectRatioMode"):
-					self.videoWidget.setAspectRatioMode(Qt.IgnoreAspectRatio)
-			except Exception:
-				pass
-			self.previewStack.addWidget(self.videoWidget)
-
-			self.mediaPlayer = QMediaPlayer(self)
-			self.mediaPlayer.setVideoOutput(self.videoWidget)
-			try:
-				self.mediaPlayer.errorOccurred.connect(self._onVideoError)
-			except Exception:
-				try:
-					self.mediaPlayer.error.connect(self._onVideoError)
-				except Exception:
-					pass
-			try:
-				self.mediaPlayer.mediaStatusChanged.connect(self._onVideoStatusChanged)
-			except Exception:
-				pass
 
 		self.previewStack.setCurrentWidget(self.imageLabel)
 		
@@ -118,7 +153,7 @@ class GlitcherWindow(QMainWindow):
 		# glitch type dropdown
 		self.typeLabel = QLabel("Glitch type")
 		self.typeSelect = QComboBox()
-		self.typeSelect.addItems(["BMP", "JPEG"])
+		self.typeSelect.addItems(_DEFAULT_GLITCH_TYPES)
 		self.typeSelect.setCurrentText("JPEG")
 
 		# glitch type amount
@@ -127,6 +162,40 @@ class GlitcherWindow(QMainWindow):
 		self.amountInput.setRange(0, 100)
 		self.amountInput.setValue(10)
 
+		# optional list of variants rendered from a single decode (GIF/MP4)
+		self.variantsLabel = QLabel("Variants (optional, e.g. JPEG:10, BMP:25:42)")
+		self.variantsInput = QLineEdit()
+		self.variantsInput.setPlaceholderText("TYPE:AMOUNT[:SEED], ...")
+		self.contactSheetCheck = QCheckBox("Save contact sheet")
+
+		# optional region of interest, rectangles or a grayscale mask image (BMP/JPEG types)
+		self.maskPath = None
+		self.regionLabel = QLabel("Glitch region (optional, x,y,w,h; ...)")
+		self.regionInput = QLineEdit()
+		self.regionInput.setPlaceholderText("whole frame")
+		self.maskButton = QPushButton("Use mask image")
+		self.maskButton.clicked.connect(self.pickMask)
+
+		# optional time range for MP4 BMP/JPEG glitching, 0 to 0 means the whole video
+		self.rangeLabel = QLabel("Time range in seconds (MP4, 0 to 0 = whole video)")
+		self.startTimeInput = QDoubleSpinBox()
+		self.startTimeInput.setRange(0, 86400)
+		self.startTimeInput.setDecimals(2)
+		self.startTimeInput.setPrefix("from ")
+		self.endTimeInput = QDoubleSpinBox()
+		self.endTimeInput.setRange(0, 86400)
+		self.endTimeInput.setDecimals(2)
+		self.endTimeInput.setPrefix("to ")
+		rangeLayout = QHBoxLayout()
+		rangeLayout.addWidget(self.startTimeInput)
+		rangeLayout.addWidget(self.endTimeInput)
+
+		# optional skip-rate ceiling for JPEG glitching of GIF/MP4, 0 keeps the fixed amount
+		self.skipRateLabel = QLabel("Max skipped frames % (JPEG gif/mp4, 0 = off)")
+		self.skipRateInput = QSpinBox()
+		self.skipRateInput.setRange(0, 100)
+		self.skipRateInput.setValue(0)
+
 		# glitch button
 		self.runButton = QPushButton("Glitch")
 		self.runButton.clicked.connect(self.runGlitch)
@@ -156,6 +225,16 @@ class GlitcherWindow(QMainWindow):
 		leftLayout.addWidget(self.typeSelect)
 		leftLayout.addWidget(self.amountLabel)
 		leftLayout.addWidget(self.amountInput)
+		leftLayout.addWidget(self.variantsLabel)
+		leftLayout.addWidget(self.variantsInput)
+		leftLayout.addWidget(self.contactSheetCheck)
+		leftLayout.addWidget(self.regionLabel)
+		leftLayout.addWidget(self.regionInput)
+		leftLayout.addWidget(self.maskButton)
+		leftLayout.addWidget(self.rangeLabel)
+		leftLayout.addLayout(rangeLayout)
+		leftLayout.addWidget(self.skipRateLabel)
+		leftLayout.addWidget(self.skipRateInput)
 		leftLayout.addWidget(self.runButton)
 		leftLayout.addWidget(self.progressLabel)
 		leftLayout.addWidget(self.progressBar)
@@ -203,6 +282,7 @@ class GlitcherWindow(QMainWindow):
 		# preview starts as the original upload
 		self.selectedPath = path
 		self.uploadLabel.setText(Path(path).name)
+		self.updateGlitchTypes(ext)
 
 		# updates the image display
 		self.updateImageDisplay()
@@ -230,6 +310,17 @@ class GlitcherWindow(QMainWindow):
 
 		#self.log(f"Loaded: {path}")
 
+	# only offer glitch types that work for the loaded file, keeping the current choice if possible
+	def updateGlitchTypes(self, ext):
+		current = self.typeSelect.currentText()
+		types = _GLITCH_TYPES.get(ext, _DEFAULT_GLITCH_TYPES)
+		self.typeSelect.clear()
+		self.typeSelect.addItems(types)
+		if current in types:
+			self.typeSelect.setCurrentText(current)
+		elif "JPEG" in types:
+			self.typeSelect.setCurrentText("JPEG")
+
 	# get media dimensions for any supported file type
 	def getMediaDimensions(self, path):
 		if not path or not Path(path).exists():
@@ -263,17 +354,10 @@ class GlitcherWindow(QMainWindow):
 						print(f"DEBUG: PIL fallback failed: {e}")
 			
 			elif ext == '.mp4':
-				# use moviepy to get actual video dimensions
-				try:
-					from moviepy.video.io.VideoFileClip import VideoFileClip
-					clip = VideoFileClip(path)
-					width, height = clip.size
-					clip.close()
-					return (width, height)
-				except Exception:
-					pass
-				# fallback if moviepy fails
-				return (1920, 1080)
+				# cached ffmpeg probe, no decoding needed
+				from modules.probe import probeMedia
+				info = probeMedia(path)
+				return (info["width"], info["height"])
 		except Exception:
 			pass
 		
@@ -330,6 +414,34 @@ class GlitcherWindow(QMainWindow):
 			self.loadFile(path)
 
 
+	# mask button function, a second click clears the mask
+	def pickMask(self):
+		if self.maskPath:
+			self.maskPath = None
+			self.maskButton.setText("Use mask image")
+			return
+		path, _ = QFileDialog.getOpenFileName(
+			self, "Select mask (white = glitch)",
+			str(Path.home() / "Downloads"), "Images (*.png *.jpg *.jpeg *.bmp);;All files (*.*)")
+		if path:
+			self.maskPath = path
+			self.maskButton.setText(f"Clear mask ({Path(path).name})")
+
+	# mask image wins over typed regions, None means the whole frame
+	def currentMask(self):
+		from modules.BMP import parseRegions
+		if self.maskPath:
+			return self.maskPath
+		regions = parseRegions(self.regionInput.text())
+		return regions or None
+
+	# (start, end) in seconds, None for an open side, both None for the whole video
+	def currentTimeRange(self):
+		start = self.startTimeInput.value()
+		end = self.endTimeInput.value()
+		return (start or None), (end or None)
+
+
 	# update the file display after the process is done
 	def runGlitch(self):
 		if not self.originalPath and not self.selectedPath:
@@ -350,13 +462,48 @@ class GlitcherWindow(QMainWindow):
 		self.progressBar.setRange(0, 0)
 		self.progressBar.setValue(0)
 
+		variantsText = self.variantsInput.text().strip()
+		if variantsText and ext not in [".gif", ".mp4"]:
+			self.log("Variants only apply to GIF and MP4, ignoring them.")
+
 		try:
-			if ext == ".gif":
+			from modules.JPEG import glitchJpeg, AdaptiveIntensity
+			from modules.BMP import convertFileToBMP, glitchBMP
+			from modules.PNG import glitchPng
+			from modules.GIF import glitchGif, glitchGifWithJPEG, glitchGifNative
+
+			# retries unreadable frames with less corruption to stay under the ceiling
+			adaptive = None
+			if self.skipRateInput.value() and choice == "JPEG" and ext in [".gif", ".mp4"] and not variantsText:
+				adaptive = AdaptiveIntensity(maxSkipRate=self.skipRateInput.value() / 100)
+				self.log(f"Adaptive amount: keeping skipped frames under {self.skipRateInput.value()}%")
+
+			mask = self.currentMask()
+			if mask is not None:
+				# regions work on decoded pixels: BMP/JPEG frames and variants, not the byte-level engines
+				if (variantsText and ext in [".gif", ".mp4"]) or (choice in ("BMP", "JPEG") and ext not in [".jpg", ".jpeg"]):
+					self.log("Glitching only inside the selected region.")
+				else:
+					self.log(f"Regions don't apply to {choice} on {ext} files, glitching the whole file.")
+
+			if variantsText and ext in [".gif", ".mp4"]:
+				outputPath = self.runVariants(srcPath, ext, variantsText, downloadsDir, mask)
+
+			elif ext == ".gif":
 				self.log("Processing GIF...")
 				outputPath = self.getUniquePath(downloadsDir, "glitched", ".gif")
 				if choice == "BMP":
 					self.log("Applying BMP glitch to frames...")
-					glitchGif(str(srcPath), str(outputPath), percent=amount, progressCallback=self.updateProgress)
+					glitchGif(str(srcPath), str(outputPath), percent=amount, progressCallback=self.updateProgress, mask=mask)
+				elif choice in ("LZW", "Palette"):
+					self.log(f"Applying {choice} glitch to compressed GIF data...")
+					total_frames = glitchGifNative(
+						str(srcPath),
+						str(outputPath),
+						percent=amount,
+						mode=choice,
+						progressCallback=self.updateProgress,)
+					self.log(f"Frames glitched: {total_frames}")
 				else:
 					self.log("Applying JPEG glitch to frames...")
 					# gets number of skipped frames and total frames for logging
@@ -364,18 +511,30 @@ class GlitcherWindow(QMainWindow):
 						str(srcPath),
 						str(outputPath),
 						percent=amount,
-						progressCallback=self.updateProgress,)
+						progressCallback=self.updateProgress,
+						mask=mask,
+						adaptive=adaptive,)
 					self.log(f"Frames skipped: {skipped} / {total_frames}")
+					if adaptive is not None:
+						self.log(adaptive.summary(amount))
 				#self.log(f"Saved: {outputPath}")
 				
 
+			elif ext == ".png" and choice == "PNG":
+				self.log("Processing PNG...")
+				outputPath = self.getUniquePath(downloadsDir, "glitched", ".png")
+				self.log(f"Applying PNG scanline glitch with {amount}% intensity...")
+				glitchPng(str(srcPath), str(outputPath), percent=amount, progressCallback=self.updateProgress)
+				self.log(f"Saved: {outputPath}")
+				
+
 			elif ext in [".bmp", ".png"]:
 				self.log("Processing BMP/PNG...")
 				outputPath = self.getUniquePath(downloadsDir, "glitched", ".bmp")
 				self.log("Converting to BMP format...")
 				convertFileToBMP(str(srcPath), str(outputPath))
 				self.log(f"Applying BMP glitch with {amount}% intensity...")
-				glitchBMP(str(outputPath), str(outputPath), amount)
+				glitchBMP(str(outputPath), str(outputPath), amount, mask=mask)
 				self.log(f"Saved: {outputPath}")
 				self.updateProgress(1, 1)
 				
@@ -393,13 +552,26 @@ class GlitcherWindow(QMainWindow):
 				self.log("Processing MP4...")
 				from modules.MP4 import glitchMp4
 				outputPath = self.getUniquePath(downloadsDir, "glitched", ".mp4")
-				self.log("Extracting frames from video...")
+				startTime, endTime = self.currentTimeRange()
+				if choice in ("H264", "Datamosh"):
+					self.log("Glitching H.264 bitstream...")
+					if startTime is not None or endTime is not None:
+						self.log(f"Time ranges don't apply to {choice}, glitching the whole video.")
+					startTime = endTime = None
+				elif startTime is not None or endTime is not None:
+					self.log("Extracting frames around the selected time range...")
+				else:
+					self.log("Extracting frames from video...")
 				skipped, total_frames, audio_status, glitch_type_str = glitchMp4(
 					str(srcPath),
 					str(outputPath),
 					percent=amount,
 					progressCallback=self.updateProgress,
 					glitchType=choice,
+					mask=mask if choice in ("BMP", "JPEG") else None,
+					startTime=startTime,
+					endTime=endTime,
+					adaptive=adaptive,
 				)
 				if skipped:
 					self.log(f"Frames skipped: {skipped} / {total_frames}")
@@ -418,17 +590,43 @@ class GlitcherWindow(QMainWindow):
 			self.selectedPath = str(outputPath)
 			self.updateImageDisplay()
 
-			self.log("Cleaning up temporary files...")
-			try:
-				shutil.rmtree("data/temp_frames")
-				self.log("Temp frames cleared.")
-			except Exception:
-				pass
 			self.log("Ready")
 		except Exception as exc:
 			QMessageBox.critical(self, "Error", str(exc))
 
 
+	# renders every variant from one decode of the source, returns the file to preview
+	def runVariants(self, srcPath, ext, variantsText, downloadsDir, mask=None):
+		from modules.variants import glitchVariants, parseVariants, variantName
+		variants = parseVariants(variantsText)
+		if not variants:
+			raise ValueError("No variants given")
+
+		outputPaths = []
+		for glitchType, amount, seed in variants:
+			baseName = f"glitched_{glitchType}_{amount}" if seed is None else f"glitched_{glitchType}_{amount}_{seed}"
+			outputPaths.append(self.getUniquePath(downloadsDir, baseName, ext))
+		contactSheetPath = None
+		if self.contactSheetCheck.isChecked():
+			contactSheetPath = self.getUniquePath(downloadsDir, "glitched_contact_sheet", ".png")
+
+		self.log(f"Rendering {len(variants)} variants from a single decode...")
+		results = glitchVariants(
+			str(srcPath),
+			[str(path) for path in outputPaths],
+			variants,
+			contactSheetPath=None if contactSheetPath is None else str(contactSheetPath),
+			progressCallback=self.updateProgress,
+			mask=mask,)
+
+		for variant, outputPath, (skipped, total_frames) in zip(variants, outputPaths, results):
+			self.log(f"{variantName(variant)}: frames skipped {skipped} / {total_frames}")
+			self.log(f"Saved: {outputPath}")
+		if contactSheetPath is not None:
+			self.log(f"Saved: {contactSheetPath}")
+			return contactSheetPath
+		return outputPaths[0]
+
 	def getUploadedFilePath(self):
 		return self.originalPath
 
@@ -489,6 +687,36 @@ class GlitcherWindow(QMainWindow):
 		except Exception:
 			pass
 
+	def createVideoPreview(self):
+		# builds the video widget and player on first use, returns False without QtMultimedia
+		if self.mediaPlayer is not None:
+			return True
+		if not loadMultimedia():
+			return False
+		self.videoWidget = QVideoWidget(self.previewStack)
+		self.videoWidget.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+		try:
+			if hasattr(self.videoWidget, "setAspectRatioMode"):
+				self.videoWidget.setAspectRatioMode(Qt.IgnoreAspectRatio)
+		except Exception:
+			pass
+		self.previewStack.addWidget(self.videoWidget)
+
+		self.mediaPlayer = QMediaPlayer(self)
+		self.mediaPlayer.setVideoOutput(self.videoWidget)
+		try:
+			self.mediaPlayer.errorOccurred.connect(self._onVideoError)
+		except Exception:
+			try:
+				self.mediaPlayer.error.connect(self._onVideoError)
+			except Exception:
+				pass
+		try:
+			self.mediaPlayer.mediaStatusChanged.connect(self._onVideoStatusChanged)
+		except Exception:
+			pass
+		return True
+
 	def stopVideoPreview(self):
 		if self.mediaPlayer is None:
 			return
@@ -498,7 +726,7 @@ class GlitcherWindow(QMainWindow):
 			pass
 
 	def startVideoPreview(self, path: str):
-		if not _HAS_QT_MULTIMEDIA or self.mediaPlayer is None or self.videoWidget is None:
+		if not self.createVideoPreview():
 			self.showUnreadablePreview()
 			return
 		if not path or not Path(path).exists():
@@ -565,8 +793,17 @@ class GlitcherWindow(QMainWindow):
 			self.previewStack.setCurrentWidget(self.imageLabel)
 			self.imageLabel.setText("Unsupported file format")
 
+	# called once the event loop has painted the window
+	def reportStartup(self):
+		elapsed = time.perf_counter() - _START_TIME
+		self.log(f"Started in {elapsed:.2f}s")
+		print(f"Time to first window: {elapsed:.3f}s")
+		if os.environ.get("GLITCHER_PREWARM", "1") != "0":
+			prewarm()
+
 if __name__ == "__main__":
 	app = QApplication([])
 	window = GlitcherWindow()
 	window.show()
+	QTimer.singleShot(0, window.reportStartup)
 	app.exec()
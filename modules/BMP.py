@@ -1,4 +1,5 @@
 from PIL import Image
+from pathlib import Path
 import random
 import numpy as np
 
@@ -10,15 +11,61 @@ def convertFileToBMP(inputPath, outputPath="data/output.bmp"):
 
 
 
-def glitchBMP(inputPath, outputPath, amount):
+def glitchBMP(inputPath, outputPath, amount, mask=None):
     # load and glitch using the same logic as glitchFrame
     img = Image.open(str(inputPath)).convert("RGB")
-    glitched = glitchFrame(img, percent=amount)
+    glitched = glitchFrame(img, percent=amount, mask=buildMask(img.size, mask))
     glitched.save(str(outputPath))
     return outputPath
 
 
-def glitchFrame(frame, percent=50, maxShift=50):
+def parseRegions(text):
+    # "10,20,300,40; 0,200,640,60" -> [(10, 20, 300, 40), (0, 200, 640, 60)] as x, y, width, height
+    regions = []
+    for item in text.split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        values = [int(value) for value in item.replace(" ", "").split(",")]
+        if len(values) != 4:
+            raise ValueError(f"Invalid region '{item}', use x,y,width,height")
+        regions.append(tuple(values))
+    return regions
+
+
+def buildMask(size, mask):
+    # turns a mask option into a boolean array of the frame size (True = glitch this pixel)
+    # mask can be None, a list of (x, y, width, height) rectangles, a grayscale image path or an array
+    if mask is None:
+        return None
+    width, height = size
+    if isinstance(mask, np.ndarray):
+        if mask.shape[:2] != (height, width):
+            raise ValueError("Mask size does not match the frame size")
+        return mask.astype(bool)
+    if isinstance(mask, (str, Path)):
+        maskImage = Image.open(str(mask)).convert("L").resize((width, height))
+        return np.array(maskImage) > 127
+
+    result = np.zeros((height, width), dtype=bool)
+    for x, y, w, h in mask:
+        result[max(0, y):max(0, y + h), max(0, x):max(0, x + w)] = True
+    return result
+
+
+def maskBounds(mask):
+    # bounding box (top, bottom, left, right) of the masked pixels, None if nothing is masked
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(mask[rows[0]:rows[-1] + 1].any(axis=0))
+    return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+
+def glitchFrame(frame, percent=50, maxShift=50, mask=None):
+    if mask is not None:
+        return _glitchMaskedFrame(frame, percent, maxShift, mask)
+
     arr = np.array(frame)
     height, width, _ = arr.shape
 
@@ -39,3 +86,59 @@ def glitchFrame(frame, percent=50, maxShift=50):
 
     return Image.fromarray(arr)
 
+
+def glitchArray(arr, percent=50, maxShift=50, rng=None):
+    # vectorised glitchFrame for raw RGB frames (height x width x 3 uint8), changes arr in place
+    # same scanline shifts and pixel noise, fast enough to keep up with live video
+    if rng is None:
+        rng = np.random.default_rng()
+    height, width, _ = arr.shape
+    chance = percent / 100
+
+    # scanline shift, every picked row is rolled by its own amount
+    rows = np.flatnonzero(rng.random(height) < chance)
+    if rows.size:
+        shifts = rng.integers(-maxShift, maxShift + 1, rows.size)
+        columns = (np.arange(width) - shifts[:, None]) % width
+        arr[rows] = arr[rows[:, None], columns]
+
+    # random pixel corruption
+    numPixels = int(height * width * chance)
+    if numPixels:
+        picked = rng.integers(0, height * width, numPixels)
+        noise = np.frombuffer(rng.bytes(numPixels * 3), dtype=np.uint8).reshape(numPixels, 3)
+        if arr.flags.c_contiguous:
+            # flat indexing is much cheaper than (y, x) pairs, reshape is a view here
+            arr.reshape(-1, 3)[picked] = noise
+        else:
+            arr[picked // width, picked % width] = noise
+    return arr
+
+
+def _glitchMaskedFrame(frame, percent, maxShift, mask):
+    # same effect as glitchFrame but only inside the mask's bounding box,
+    # so the work scales with the masked area instead of the whole frame
+    arr = np.array(frame)
+    bounds = maskBounds(mask)
+    if bounds is None:
+        return Image.fromarray(arr)
+    top, bottom, left, right = bounds
+    region = arr[top:bottom, left:right]
+    regionMask = mask[top:bottom, left:right]
+    glitched = region.copy()
+
+    # scanline shift, rows wrap around inside the region
+    for y in range(glitched.shape[0]):
+        if random.random() < (percent / 100):
+            shift = random.randint(-maxShift, maxShift)
+            glitched[y] = np.roll(glitched[y], shift, axis=0)
+
+    # random pixel corruption, only picked among masked pixels
+    ys, xs = np.nonzero(regionMask)
+    numPixels = int(len(ys) * (percent / 100))
+    for _ in range(numPixels):
+        i = random.randrange(len(ys))
+        glitched[ys[i], xs[i]] = [random.randint(0, 255) for _ in range(3)]
+
+    arr[top:bottom, left:right] = np.where(regionMask[:, :, None], glitched, region)
+    return Image.fromarray(arr)
@@ -1,6 +1,6 @@
 from PIL import Image, ImageSequence
-from modules.BMP import glitchFrame   # BMP glitching
-from io import BytesIO
+from modules.BMP import glitchFrame, buildMask   # BMP glitching
+from modules.JPEG import glitchFrameWithJPEG
 import random
 
 def convertGIFtoBMPFrames(gifPath):
@@ -14,13 +14,14 @@ def convertGIFtoBMPFrames(gifPath):
         durations.append(frame.info.get("duration", gif.info.get("duration", 100)))
     return frames, durations, loop, disposal
 
-def glitchGif(inputGif, outputGif, percent=50, progressCallback=None):
+def glitchGif(inputGif, outputGif, percent=50, progressCallback=None, mask=None):
     # BMP-style glitching of GIF frames
     frames, durations, loop, disposal = convertGIFtoBMPFrames(str(inputGif))
+    mask = buildMask(frames[0].size, mask)
     glitchedFrames = []
     total = len(frames)
     for idx, frame in enumerate(frames, start=1):
-        glitchedFrames.append(glitchFrame(frame, percent=percent))
+        glitchedFrames.append(glitchFrame(frame, percent=percent, mask=mask))
         if progressCallback is not None:
             progressCallback(idx, total)
 
@@ -32,53 +33,34 @@ def glitchGif(inputGif, outputGif, percent=50, progressCallback=None):
         duration=durations,
         disposal=disposal)
 
-def glitchGifWithJPEG(inputGif, outputGif, percent=50, maxChunkLength=50, seed=None, tempFolder="data/temp_frames", progressCallback=None):
+def glitchGifWithJPEG(inputGif, outputGif, percent=50, maxChunkLength=50, seed=None, tempFolder=None, progressCallback=None, mask=None, adaptive=None):
     # glitches a GIF using JPEG-style corruption
     # if a frame becomes unreadable after glitching, the original frame is used instead
     # uses iteration-based small chunks for reliable results on small frames
+    # frames are glitched in memory, tempFolder is only kept for older callers
+    # adaptive is an optional AdaptiveIntensity that retries unreadable frames and keeps the skip rate down
     frames, durations, loop, disposal = convertGIFtoBMPFrames(str(inputGif))
+    mask = buildMask(frames[0].size, mask)
     glitchedFrames = []
     skippedFrames = 0
 
     total = len(frames)
     for idx, frame in enumerate(frames, start=1):
         try:
-            # save frame to in-memory JPEG
-            mem_file = BytesIO()
-            frame.save(mem_file, format="JPEG", quality=95)
-            mem_file.seek(0)
-
-            # convert to bytearray
-            jpgBytes = bytearray(mem_file.read())
-            
-            headerEnd = jpgBytes.find(b"\xFF\xDA") + 2
-            length = len(jpgBytes) - headerEnd
-            
-            # dynamically set max chunk length based on frame size
-            dynamicMaxChunk = max(1, min(maxChunkLength, length // 20))
-            
-            # use percent as number of iterations
-            iterations = max(1, percent)
-
             # apply snorpey-style iteration-based glitch
             if seed is not None:
                 random.seed(seed + idx)  # different seed per frame for variety
 
-            # apply corruption as multiple small chunks
-            for _ in range(iterations):
-                pos = random.randint(headerEnd, len(jpgBytes) - 2)
-                chunkLen = random.randint(1, dynamicMaxChunk)
-                chunkLen = min(chunkLen, len(jpgBytes) - pos)
-                for j in range(chunkLen):
-                    if pos + j < len(jpgBytes):
-                        jpgBytes[pos + j] = random.randint(0, 255)
-
-            # load glitched JPEG back into PIL and verify it can decode
-            glitchedImage = Image.open(BytesIO(jpgBytes))
-            glitchedImage.verify()  # verify it's valid
-            # reopen since verify() closes the image
-            glitchedImage = Image.open(BytesIO(jpgBytes))
-            glitchedFrames.append(glitchedImage.convert("RGB"))
+            if adaptive is None:
+                glitchedFrames.append(glitchFrameWithJPEG(frame, percent=percent, maxChunkLength=maxChunkLength, mask=mask))
+            else:
+                glitched = adaptive.glitch(
+                    lambda amount, chunkLength: glitchFrameWithJPEG(frame, percent=amount, maxChunkLength=chunkLength, mask=mask),
+                    percent,
+                    maxChunkLength)
+                if glitched is None:
+                    raise ValueError("Frame unreadable after every attempt")
+                glitchedFrames.append(glitched)
 
         except (OSError, Exception):
             # if frame is corrupted or unreadable, use original
@@ -89,6 +71,8 @@ def glitchGifWithJPEG(inputGif, outputGif, percent=50, maxChunkLength=50, seed=N
             progressCallback(idx, total)
 
     print(f"{skippedFrames}/{len(frames)} frames skipped")
+    if adaptive is not None:
+        print(adaptive.summary(percent))
 
     # reassemble GIF
     glitchedFrames[0].save(
@@ -100,3 +84,156 @@ def glitchGifWithJPEG(inputGif, outputGif, percent=50, maxChunkLength=50, seed=N
         disposal=disposal)
 
     return skippedFrames, total
+
+def parseGifBlocks(gifBytes):
+    # walks the GIF block structure once and returns the byte ranges that can be glitched:
+    # the global color table and, per frame, its local color table and its LZW data sub-blocks
+    if gifBytes[:6] not in (b"GIF87a", b"GIF89a"):
+        raise ValueError("Not a GIF file")
+
+    pos = 13
+    globalTable = None
+    packed = gifBytes[10]
+    if packed & 0x80:
+        tableSize = 3 * (2 << (packed & 0x07))
+        globalTable = (pos, pos + tableSize)
+        pos += tableSize
+
+    frames = []
+    while pos < len(gifBytes):
+        blockType = gifBytes[pos]
+        if blockType == 0x3B:  # trailer
+            break
+        elif blockType == 0x21:  # extension: label then sub-blocks, left untouched
+            pos = _skipSubBlocks(gifBytes, pos + 2)[0]
+        elif blockType == 0x2C:  # image descriptor
+            packed = gifBytes[pos + 9]
+            pos += 10
+            localTable = None
+            if packed & 0x80:
+                tableSize = 3 * (2 << (packed & 0x07))
+                localTable = (pos, pos + tableSize)
+                pos += tableSize
+            minCodeSize = gifBytes[pos]
+            pos, dataRanges = _skipSubBlocks(gifBytes, pos + 1)
+            frames.append({"localTable": localTable, "minCodeSize": minCodeSize, "data": dataRanges})
+        else:
+            raise ValueError(f"Unknown GIF block 0x{blockType:02X} at byte {pos}")
+    return globalTable, frames
+
+
+def _skipSubBlocks(gifBytes, pos):
+    # returns (position after the block terminator, payload ranges without the length bytes)
+    ranges = []
+    while pos < len(gifBytes):
+        size = gifBytes[pos]
+        pos += 1
+        if size == 0:
+            break
+        ranges.append((pos, min(pos + size, len(gifBytes))))
+        pos += size
+    return pos, ranges
+
+
+def _literalCodePositions(data, minCodeSize):
+    # walks the LZW code stream (codes only, no pixels) and returns the bit position of every literal code
+    clearCode = 1 << minCodeSize
+    endCode = clearCode + 1
+    nextCode = clearCode + 2
+    codeSize = minCodeSize + 1
+    literals = []
+    bitPos = 0
+    totalBits = len(data) * 8
+    afterClear = True
+    while bitPos + codeSize <= totalBits:
+        value = int.from_bytes(data[bitPos >> 3:(bitPos >> 3) + 3], "little")
+        code = (value >> (bitPos & 7)) & ((1 << codeSize) - 1)
+        if code == clearCode:
+            # the clear code itself is read at the current width, only the codes after it are narrower
+            bitPos += codeSize
+            nextCode = clearCode + 2
+            codeSize = minCodeSize + 1
+            afterClear = True
+            continue
+        if code == endCode:
+            break
+        if code > nextCode or (afterClear and code > clearCode):
+            # a code the decoder couldn't have in its table yet means the walk lost sync,
+            # rewriting bits at positions from here on would break the frame so leave it alone
+            return []
+        if code < clearCode:
+            literals.append((bitPos, codeSize))
+        bitPos += codeSize
+        # every code except the first after a clear adds one table entry
+        if not afterClear and nextCode < 4096:
+            nextCode += 1
+            if nextCode == (1 << codeSize) and codeSize < 12:
+                codeSize += 1
+        afterClear = False
+    return literals
+
+
+def _corruptLzwLiterals(gifBytes, frame, percent):
+    # rewrites literal codes with other literal values at the same bit positions:
+    # code widths and table growth stay the same, so the stream stays decodable
+    # while every string built from the changed literal inherits the wrong color
+    data = bytearray().join(gifBytes[start:end] for start, end in frame["data"])
+    literals = _literalCodePositions(data, frame["minCodeSize"])
+    if not literals:
+        return
+
+    clearCode = 1 << frame["minCodeSize"]
+    iterations = max(1, percent)
+    for _ in range(iterations):
+        bitPos, codeSize = random.choice(literals)
+        newCode = random.randint(0, clearCode - 1)
+        value = int.from_bytes(data[bitPos >> 3:(bitPos >> 3) + 3], "little")
+        mask = ((1 << codeSize) - 1) << (bitPos & 7)
+        value = (value & ~mask) | (newCode << (bitPos & 7))
+        byteCount = len(data[bitPos >> 3:(bitPos >> 3) + 3])
+        data[bitPos >> 3:(bitPos >> 3) + byteCount] = value.to_bytes(byteCount, "little")
+
+    # write the payload back into the sub-blocks, the length bytes are untouched
+    pos = 0
+    for start, end in frame["data"]:
+        gifBytes[start:end] = data[pos:pos + end - start]
+        pos += end - start
+
+
+def _corruptColorTable(gifBytes, table, percent):
+    start, end = table
+    for entry in range(start, end, 3):
+        if random.random() < (percent / 100):
+            gifBytes[entry:entry + 3] = bytes(random.randint(0, 255) for _ in range(3))
+
+
+def glitchGifNative(inputGif, outputGif, percent=10, mode="LZW", seed=None, progressCallback=None):
+    # glitches the GIF in its compressed form, no pixel is ever decoded
+    # "LZW" corrupts the compressed image data, "Palette" corrupts the color tables
+    # timing, disposal and loop extensions are copied byte for byte
+    if seed is not None:
+        random.seed(seed)
+
+    with open(inputGif, "rb") as f:
+        gifBytes = bytearray(f.read())
+    globalTable, frames = parseGifBlocks(gifBytes)
+
+    total = len(frames)
+    if mode == "Palette" and globalTable is not None:
+        # frames without their own table share the global one
+        if any(frame["localTable"] is None for frame in frames):
+            _corruptColorTable(gifBytes, globalTable, percent)
+
+    for idx, frame in enumerate(frames, start=1):
+        if mode == "Palette":
+            if frame["localTable"] is not None:
+                _corruptColorTable(gifBytes, frame["localTable"], percent)
+        else:
+            _corruptLzwLiterals(gifBytes, frame, percent)
+        if progressCallback is not None:
+            progressCallback(idx, total)
+
+    with open(outputGif, "wb") as f:
+        f.write(gifBytes)
+
+    return total
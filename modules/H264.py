@@ -0,0 +1,684 @@
+import os
+import random
+import shutil
+import struct
+from modules.probe import probeMedia
+
+
+NAL_SLICE = 1
+NAL_IDR_SLICE = 5
+NAL_SPS = 7
+NAL_PPS = 8
+NAL_FILLER = 12
+
+# slice_type values for P, B and SP slices (the +5 variants mean "same type for the whole picture")
+_PREDICTED_SLICE_TYPES = {0, 1, 3, 5, 6, 8}
+_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+# profiles whose SPS carries chroma format, bit depth and scaling matrices
+_HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+# escaped bytes of a NAL read before looking for a clean split, comfortably more than any slice header
+_HEADER_BYTES = 48
+
+
+def _iterBoxes(data, start, end):
+    # yields (type, payload start, box end) for every box between start and end
+    while start + 8 <= end:
+        size, boxType = struct.unpack(">I4s", data[start:start + 8])
+        headerSize = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[start + 8:start + 16])[0]
+            headerSize = 16
+        elif size == 0:
+            size = end - start
+        if size < headerSize:
+            break
+        yield boxType, start + headerSize, start + size
+        start += size
+
+
+def _locateMoov(file):
+    # returns (position, size) of the moov box and the file size
+    file.seek(0, 2)
+    fileSize = file.tell()
+    pos = 0
+    while pos + 8 <= fileSize:
+        file.seek(pos)
+        header = file.read(16)
+        size, boxType = struct.unpack(">I4s", header[:8])
+        if size == 1:
+            size = struct.unpack(">Q", header[8:16])[0]
+        elif size == 0:
+            size = fileSize - pos
+        if boxType == b"moov":
+            return pos, size, fileSize
+        if size < 8:
+            break
+        pos += size
+    raise ValueError("No moov box found in MP4")
+
+
+def _readMoov(file):
+    # only the moov box is loaded, mdat is never read here
+    pos, size, _ = _locateMoov(file)
+    file.seek(pos)
+    return file.read(size)
+
+
+def _walkBoxes(data, start, end, parents=()):
+    # yields (type, box start, payload start, box end, parent box starts) for every box, containers included
+    boxStart = start
+    for boxType, payloadStart, boxEnd in _iterBoxes(data, start, end):
+        yield boxType, boxStart, payloadStart, boxEnd, parents
+        if boxType in _CONTAINER_BOXES:
+            yield from _walkBoxes(data, payloadStart, boxEnd, parents + (boxStart,))
+        boxStart = boxEnd
+
+
+def _findVideoTrack(moov):
+    for boxType, trakStart, trakEnd in _iterBoxes(moov, 8, len(moov)):
+        if boxType != b"trak":
+            continue
+        boxes = {}
+        # walk trak > mdia > minf > stbl and collect the boxes needed to locate samples
+        stack = [(trakStart, trakEnd)]
+        while stack:
+            start, end = stack.pop()
+            for childType, childStart, childEnd in _iterBoxes(moov, start, end):
+                if childType in _CONTAINER_BOXES:
+                    stack.append((childStart, childEnd))
+                else:
+                    boxes.setdefault(childType, moov[childStart:childEnd])
+        hdlr = boxes.get(b"hdlr")
+        if hdlr is not None and hdlr[8:12] == b"vide":
+            return boxes
+    raise ValueError("No video track found in MP4")
+
+
+def _readAvcC(stsd):
+    # stsd > avc1/avc3 sample entry > avcC, the visual sample entry header is 78 bytes
+    # returns (NAL length size, SPS NAL units, PPS NAL units)
+    for entryType, entryStart, entryEnd in _iterBoxes(stsd, 8, len(stsd)):
+        if entryType not in (b"avc1", b"avc3"):
+            continue
+        for childType, childStart, childEnd in _iterBoxes(stsd, entryStart + 78, entryEnd):
+            if childType != b"avcC":
+                continue
+            avcC = stsd[childStart:childEnd]
+            lengthSize = (avcC[4] & 0x03) + 1
+            pos = 5
+            parameterSets = []
+            for countMask in (0x1F, 0xFF):
+                count = avcC[pos] & countMask
+                pos += 1
+                units = []
+                for _ in range(count):
+                    size = struct.unpack(">H", avcC[pos:pos + 2])[0]
+                    units.append(bytes(avcC[pos + 2:pos + 2 + size]))
+                    pos += 2 + size
+                parameterSets.append(units)
+            return lengthSize, parameterSets[0], parameterSets[1]
+    raise ValueError("MP4 video track is not H.264 (no avcC)")
+
+
+def _nalLengthSize(stsd):
+    return _readAvcC(stsd)[0]
+
+
+def readParameterSets(inputPath):
+    # returns ({sps id: parsed SPS}, {pps id: parsed PPS}) from the video track's avcC
+    with open(inputPath, "rb") as f:
+        moov = _readMoov(f)
+    _, spsUnits, ppsUnits = _readAvcC(_findVideoTrack(moov)[b"stsd"])
+    spsMap = {}
+    ppsMap = {}
+    for nal in spsUnits:
+        sps = parseSps(nal)
+        spsMap[sps["id"]] = sps
+    for nal in ppsUnits:
+        pps = parsePps(nal)
+        ppsMap[pps["id"]] = pps
+    return spsMap, ppsMap
+
+
+def readSampleTable(inputPath):
+    # returns (sample offsets, sample sizes, sync sample indexes, NAL length size) of the video track
+    with open(inputPath, "rb") as f:
+        moov = _readMoov(f)
+    boxes = _findVideoTrack(moov)
+    lengthSize = _nalLengthSize(boxes[b"stsd"])
+
+    stsz = boxes.get(b"stsz")
+    if stsz is None:
+        raise ValueError("Fragmented MP4 files are not supported")
+    uniformSize, sampleCount = struct.unpack(">II", stsz[4:12])
+    if uniformSize:
+        sizes = [uniformSize] * sampleCount
+    else:
+        sizes = list(struct.unpack(f">{sampleCount}I", stsz[12:12 + 4 * sampleCount]))
+
+    if b"co64" in boxes:
+        count = struct.unpack(">I", boxes[b"co64"][4:8])[0]
+        chunkOffsets = struct.unpack(f">{count}Q", boxes[b"co64"][8:8 + 8 * count])
+    else:
+        count = struct.unpack(">I", boxes[b"stco"][4:8])[0]
+        chunkOffsets = struct.unpack(f">{count}I", boxes[b"stco"][8:8 + 4 * count])
+
+    stsc = boxes[b"stsc"]
+    entryCount = struct.unpack(">I", stsc[4:8])[0]
+    stscEntries = [struct.unpack(">III", stsc[8 + 12 * i:20 + 12 * i]) for i in range(entryCount)]
+
+    # samples in a chunk are stored back to back starting at the chunk offset
+    offsets = []
+    sample = 0
+    for entry, (firstChunk, samplesPerChunk, _) in enumerate(stscEntries):
+        lastChunk = stscEntries[entry + 1][0] - 1 if entry + 1 < entryCount else len(chunkOffsets)
+        for chunk in range(firstChunk - 1, lastChunk):
+            pos = chunkOffsets[chunk]
+            for _ in range(samplesPerChunk):
+                if sample >= sampleCount:
+                    break
+                offsets.append(pos)
+                pos += sizes[sample]
+                sample += 1
+
+    stss = boxes.get(b"stss")
+    if stss is None:
+        syncSamples = set(range(sampleCount))
+    else:
+        count = struct.unpack(">I", stss[4:8])[0]
+        syncSamples = {number - 1 for number in struct.unpack(f">{count}I", stss[8:8 + 4 * count])}
+
+    return offsets, sizes[:len(offsets)], syncSamples, lengthSize
+
+
+def iterNalUnits(sample, lengthSize):
+    # yields (start, end) of each length-prefixed NAL unit inside one MP4 sample
+    pos = 0
+    while pos + lengthSize <= len(sample):
+        nalLength = int.from_bytes(sample[pos:pos + lengthSize], "big")
+        start = pos + lengthSize
+        end = min(start + nalLength, len(sample))
+        if start < end:
+            yield start, end
+        pos = end
+
+
+def _unescapeRbsp(data):
+    # removes emulation prevention bytes (00 00 03 -> 00 00)
+    rbsp = bytearray()
+    zeros = 0
+    for byte in data:
+        if zeros >= 2 and byte == 3:
+            zeros = 0
+            continue
+        rbsp.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return rbsp
+
+
+def _escapeRbsp(rbsp):
+    # inserts emulation prevention bytes where the payload could look like a start code
+    data = bytearray()
+    zeros = 0
+    for byte in rbsp:
+        if zeros >= 2 and byte <= 3:
+            data.append(3)
+            zeros = 0
+        data.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    if data and data[-1] == 0:
+        data.append(3)
+    return data
+
+
+def _toBits(data):
+    return "".join(f"{byte:08b}" for byte in data)
+
+
+def _readSe(bits, pos):
+    # signed exp-Golomb se(v)
+    value, pos = _readUe(bits, pos)
+    return (value + 1) // 2 if value % 2 else -(value // 2), pos
+
+
+def parseSps(nal):
+    # reads the SPS fields needed to find and rewrite frame_num and pic_order_cnt_lsb in slice headers
+    bits = _toBits(_unescapeRbsp(nal[1:]))
+    profile = int(bits[0:8], 2)
+    spsId, pos = _readUe(bits, 24)
+    separateColourPlane = False
+    if profile in _HIGH_PROFILES:
+        chromaFormat, pos = _readUe(bits, pos)
+        if chromaFormat == 3:
+            separateColourPlane = bits[pos] == "1"
+            pos += 1
+        _, pos = _readUe(bits, pos)  # bit_depth_luma_minus8
+        _, pos = _readUe(bits, pos)  # bit_depth_chroma_minus8
+        pos += 1  # qpprime_y_zero_transform_bypass_flag
+        scalingMatrixPresent = bits[pos] == "1"
+        pos += 1
+        if scalingMatrixPresent:
+            for index in range(8 if chromaFormat != 3 else 12):
+                listPresent = bits[pos] == "1"
+                pos += 1
+                if not listPresent:
+                    continue
+                lastScale = nextScale = 8
+                for _ in range(16 if index < 6 else 64):
+                    if nextScale != 0:
+                        delta, pos = _readSe(bits, pos)
+                        nextScale = (lastScale + delta + 256) % 256
+                    lastScale = nextScale or lastScale
+    log2MaxFrameNum, pos = _readUe(bits, pos)
+    pocType, pos = _readUe(bits, pos)
+    log2MaxPocLsb = None
+    if pocType == 0:
+        log2MaxPocLsb, pos = _readUe(bits, pos)
+        log2MaxPocLsb += 4
+    elif pocType == 1:
+        pos += 1  # delta_pic_order_always_zero_flag
+        _, pos = _readSe(bits, pos)
+        _, pos = _readSe(bits, pos)
+        cycleLength, pos = _readUe(bits, pos)
+        for _ in range(cycleLength):
+            _, pos = _readSe(bits, pos)
+    _, pos = _readUe(bits, pos)  # max_num_ref_frames
+    pos += 1  # gaps_in_frame_num_value_allowed_flag
+    _, pos = _readUe(bits, pos)  # pic_width_in_mbs_minus1
+    _, pos = _readUe(bits, pos)  # pic_height_in_map_units_minus1
+    return {
+        "id": spsId,
+        "separateColourPlane": separateColourPlane,
+        "log2MaxFrameNum": log2MaxFrameNum + 4,
+        "pocType": pocType,
+        "log2MaxPocLsb": log2MaxPocLsb,
+        "frameMbsOnly": bits[pos] == "1",}
+
+
+def parsePps(nal):
+    bits = _toBits(_unescapeRbsp(nal[1:32]))
+    ppsId, pos = _readUe(bits, 0)
+    spsId, pos = _readUe(bits, pos)
+    return {"id": ppsId, "spsId": spsId}
+
+
+def _headerSplit(payload):
+    # end of the escaped bytes that hold the slice header, always after a plain data byte
+    # so re-escaping the header never depends on the bytes that follow it
+    split = min(_HEADER_BYTES, len(payload))
+    while split < len(payload) and payload[split - 1] in (0, 3):
+        split += 1
+    return split
+
+
+def parseSliceHeader(nal, spsMap, ppsMap):
+    # returns the slice header fields up to pic_order_cnt_lsb with their bit positions,
+    # None when the slice refers to parameter sets that haven't been seen
+    payload = nal[1:]
+    split = _headerSplit(payload)
+    bits = _toBits(_unescapeRbsp(payload[:split]))
+    _, pos = _readUe(bits, 0)  # first_mb_in_slice
+    sliceType, pos = _readUe(bits, pos)
+    ppsId, pos = _readUe(bits, pos)
+    pps = ppsMap.get(ppsId)
+    sps = spsMap.get(pps["spsId"]) if pps else None
+    if sps is None:
+        return None
+    if sps["separateColourPlane"]:
+        pos += 2
+    header = {
+        "nalType": nal[0] & 0x1F,
+        "refIdc": (nal[0] >> 5) & 0x03,
+        "sliceType": sliceType % 5,
+        "sps": sps,
+        "split": split,
+        "frameNumPos": pos,
+        "frameNum": int(bits[pos:pos + sps["log2MaxFrameNum"]], 2),
+        "fieldPic": False,
+        "pocLsbPos": None,
+        "pocLsb": None,}
+    pos += sps["log2MaxFrameNum"]
+    if not sps["frameMbsOnly"]:
+        header["fieldPic"] = bits[pos] == "1"
+        pos += 2 if header["fieldPic"] else 1
+    if header["nalType"] == NAL_IDR_SLICE:
+        _, pos = _readUe(bits, pos)  # idr_pic_id
+    if sps["pocType"] == 0:
+        header["pocLsbPos"] = pos
+        header["pocLsb"] = int(bits[pos:pos + sps["log2MaxPocLsb"]], 2)
+    return header
+
+
+def renumberSlice(nal, header, frameNum, pocLsb=None):
+    # rewrites frame_num (and pic_order_cnt_lsb) of a slice, both are fixed width so only
+    # emulation prevention bytes can change the NAL size, callers check that themselves
+    payload = nal[1:]
+    split = header["split"]
+    rbsp = _unescapeRbsp(payload[:split])
+    bits = list(_toBits(rbsp))
+    sps = header["sps"]
+    fields = [(header["frameNumPos"], sps["log2MaxFrameNum"], frameNum)]
+    if pocLsb is not None and header["pocLsbPos"] is not None:
+        fields.append((header["pocLsbPos"], sps["log2MaxPocLsb"], pocLsb))
+    for pos, width, value in fields:
+        bits[pos:pos + width] = f"{value % (1 << width):0{width}b}"
+    rbsp = int("".join(bits), 2).to_bytes(len(rbsp), "big")
+    return bytes(nal[:1]) + bytes(_escapeRbsp(rbsp)) + bytes(payload[split:])
+
+
+def _readUe(bits, pos):
+    # exp-Golomb ue(v), returns (value, new bit position)
+    zeros = 0
+    while pos < len(bits) and bits[pos] == "0":
+        zeros += 1
+        pos += 1
+    pos += 1
+    value = (1 << zeros) - 1
+    if zeros:
+        value += int(bits[pos:pos + zeros] or "0", 2)
+    return value, pos + zeros
+
+
+def parseSliceType(nal):
+    # reads slice_type from the slice header (after first_mb_in_slice)
+    rbsp = bytearray()
+    zeros = 0
+    # only the first few bytes are needed, strip emulation prevention bytes from them
+    for byte in nal[1:16]:
+        if zeros >= 2 and byte == 3:
+            zeros = 0
+            continue
+        rbsp.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    bits = "".join(f"{byte:08b}" for byte in rbsp)
+    _, pos = _readUe(bits, 0)
+    sliceType, _ = _readUe(bits, pos)
+    return sliceType
+
+
+def _sliceKind(sample, lengthSize):
+    # "I" for IDR access units, "P" for predicted ones, None for anything else
+    for start, end in iterNalUnits(sample, lengthSize):
+        nalType = sample[start] & 0x1F
+        if nalType == NAL_IDR_SLICE:
+            return "I"
+        if nalType == NAL_SLICE:
+            return "P" if parseSliceType(sample[start:end]) in _PREDICTED_SLICE_TYPES else None
+    return None
+
+
+def corruptSlice(sample, start, end, percent=10, maxChunkLength=50):
+    # overwrites small chunks of slice data in place, the NAL header and the start of the slice header are kept
+    headerEnd = start + min(end - start - 1, max(8, (end - start) // 10))
+    length = end - headerEnd
+    if length <= 1:
+        return
+
+    dynamicMaxChunk = max(1, min(maxChunkLength, length // 20))
+    iterations = max(1, percent // 10)
+    for _ in range(iterations):
+        pos = random.randint(headerEnd, end - 2)
+        chunkLen = min(random.randint(1, dynamicMaxChunk), end - 1 - pos)
+        for j in range(chunkLen):
+            # values below 4 could form an emulation prevention sequence
+            sample[pos + j] = random.randint(4, 255)
+
+
+def _fillerNal(size, lengthSize):
+    # a filler data NAL unit of exactly size bytes including its length prefix
+    payload = bytes([NAL_FILLER]) + b"\xFF" * (size - lengthSize - 2) + b"\x80"
+    return len(payload).to_bytes(lengthSize, "big") + payload
+
+
+def glitchH264(inputPath, outputPath, percent=10, seed=None, maxChunkLength=50, dropKeyframes=False, progressCallback=None):
+    # glitches the H.264 samples of an MP4 in place: nothing is decoded or re-encoded
+    # and every other byte (audio, container, timestamps) is copied unchanged
+    # percent is the chance for each P/B frame to get its slice data corrupted
+    # dropKeyframes replaces every IDR frame after the first with the next P frame (datamosh),
+    # renumbering the slices after it so every sample still decodes, keyframes that can't be
+    # replaced at the same size are kept
+    info = probeMedia(inputPath)
+    if info["videoCodec"] != "h264":
+        raise ValueError(f"H264 glitch needs an H.264 video stream, found: {info['videoCodec']}")
+
+    offsets, sizes, syncSamples, lengthSize = readSampleTable(inputPath)
+    if seed is not None:
+        random.seed(seed)
+
+    replacements = {}
+    headerPatches = {}
+    if dropKeyframes:
+        spsMap, ppsMap = readParameterSets(inputPath)
+        with open(inputPath, "rb") as f:
+            replacements, headerPatches = _planDatamosh(f, offsets, sizes, lengthSize, spsMap, ppsMap)
+
+    shutil.copyfile(str(inputPath), str(outputPath))
+
+    total = len(offsets)
+    corruptedFrames = 0
+    with open(outputPath, "r+b") as f:
+        for index, (offset, size) in enumerate(zip(offsets, sizes)):
+            f.seek(offset)
+            sample = bytearray(f.read(size))
+            kind = _sliceKind(sample, lengthSize)
+
+            replacement = replacements.get(index)
+            if replacement is None:
+                for nalStart, header in headerPatches.get(index, ()):
+                    sample[nalStart:nalStart + len(header)] = header
+                    replacement = sample
+                if kind == "P" and random.random() < (percent / 100):
+                    for start, end in iterNalUnits(sample, lengthSize):
+                        if sample[start] & 0x1F == NAL_SLICE:
+                            corruptSlice(sample, start, end, percent=percent, maxChunkLength=maxChunkLength)
+                    replacement = sample
+                    corruptedFrames += 1
+
+            if replacement is not None:
+                f.seek(offset)
+                f.write(replacement)
+
+            if progressCallback is not None:
+                progressCallback(index + 1, total)
+
+    # the dropped keyframes are P frames now, seeking must not land on them
+    if replacements:
+        _removeSyncSamples(outputPath, {index for index in replacements if index in syncSamples})
+
+    return corruptedFrames, len(replacements), total
+
+
+def _planDatamosh(f, offsets, sizes, lengthSize, spsMap, ppsMap):
+    # reads the slice headers of every sample and works out which keyframes can be dropped
+    # a dropped IDR is replaced by a copy of the next P frame, and every slice after it gets its
+    # frame_num and picture order count shifted so the decoder sees one continuous group of pictures
+    # returns ({sample index: replacement sample}, {sample index: [(NAL start, new header bytes)]})
+    pictures = []
+    for offset, size in zip(offsets, sizes):
+        f.seek(offset)
+        sample = f.read(size)
+        slices = []
+        for start, end in iterNalUnits(sample, lengthSize):
+            nalType = sample[start] & 0x1F
+            try:
+                if nalType == NAL_SPS:
+                    sps = parseSps(sample[start:end])
+                    spsMap[sps["id"]] = sps
+                elif nalType == NAL_PPS:
+                    pps = parsePps(sample[start:end])
+                    ppsMap[pps["id"]] = pps
+                elif nalType in (NAL_SLICE, NAL_IDR_SLICE):
+                    slices.append((start, end, parseSliceHeader(sample[start:end], spsMap, ppsMap)))
+            except (IndexError, ValueError):
+                slices.append((start, end, None))
+        pictures.append(slices)
+
+    gopStarts = [index for index, slices in enumerate(pictures) if any(header and header["nalType"] == NAL_IDR_SLICE for _, _, header in slices)]
+    replacements = {}
+    headerPatches = {}
+    lastRefFrameNum = 0
+    maxPoc = 0
+    for gop, start in enumerate(gopStarts):
+        end = gopStarts[gop + 1] if gop + 1 < len(gopStarts) else len(pictures)
+        pocs = _unwrapPocs(pictures[start:end])
+        frameNumOffset = pocOffset = 0
+        plan = None
+        if gop > 0:
+            # continue right after the last reference picture and the highest POC shown so far
+            frameNumOffset = lastRefFrameNum + 1
+            pocOffset = maxPoc + 2
+            plan = _moshGop(f, offsets, sizes, lengthSize, pictures, pocs, start, end, frameNumOffset, pocOffset)
+        if plan is None:
+            # keyframe kept, the decoder restarts numbering here
+            frameNumOffset = pocOffset = 0
+            maxPoc = 0
+        else:
+            replacements[start], patches = plan
+            headerPatches.update(patches)
+
+        for slices, poc in zip(pictures[start:end], pocs):
+            header = slices[0][2] if slices else None
+            if header is None:
+                continue
+            if header["refIdc"]:
+                lastRefFrameNum = (header["frameNum"] + frameNumOffset) % (1 << header["sps"]["log2MaxFrameNum"])
+            if poc is not None:
+                maxPoc = max(maxPoc, poc + pocOffset)
+    return replacements, headerPatches
+
+
+def _unwrapPocs(pictures):
+    # picture order counts of one group of pictures (pic_order_cnt_type 0), None for other types
+    prevMsb = prevLsb = 0
+    pocs = []
+    for slices in pictures:
+        header = slices[0][2] if slices else None
+        if header is None or header["pocLsb"] is None:
+            pocs.append(None)
+            continue
+        if header["nalType"] == NAL_IDR_SLICE:
+            prevMsb = prevLsb = 0
+        maxLsb = 1 << header["sps"]["log2MaxPocLsb"]
+        lsb = header["pocLsb"]
+        if lsb < prevLsb and prevLsb - lsb >= maxLsb // 2:
+            msb = prevMsb + maxLsb
+        elif lsb > prevLsb and lsb - prevLsb > maxLsb // 2:
+            msb = prevMsb - maxLsb
+        else:
+            msb = prevMsb
+        if header["refIdc"]:
+            prevMsb, prevLsb = msb, lsb
+        pocs.append(msb + lsb)
+    return pocs
+
+
+def _moshGop(f, offsets, sizes, lengthSize, pictures, pocs, start, end, frameNumOffset, pocOffset):
+    # plans dropping the IDR at start, None when the group can't be renumbered without changing sample sizes
+    for slices in pictures[start:end]:
+        if not slices or any(header is None or header["fieldPic"] or header["sps"]["pocType"] == 1 for _, _, header in slices):
+            return None
+
+    def shifted(frameNum, poc):
+        return frameNum + frameNumOffset, (None if poc is None else poc + pocOffset)
+
+    patches = {}
+    candidate = None
+    for index in range(start + 1, end):
+        f.seek(offsets[index])
+        sample = f.read(sizes[index])
+        samplePatches = []
+        for nalStart, nalEnd, header in pictures[index]:
+            nal = sample[nalStart:nalEnd]
+            if renumberSlice(nal, header, header["frameNum"], header["pocLsb"]) != nal:
+                return None
+            renumbered = renumberSlice(nal, header, *shifted(header["frameNum"], pocs[index - start]))
+            if len(renumbered) != len(nal):
+                return None
+            samplePatches.append((nalStart, renumbered[:header["split"] + 1]))
+        patches[index] = samplePatches
+        # the first P reference frame takes the IDR's place
+        if candidate is None and all(header["sliceType"] == 0 and header["refIdc"] for _, _, header in pictures[index]):
+            candidate = (sample, pictures[index])
+    if candidate is None:
+        return None
+
+    idrHeader = pictures[start][0][2]
+    sample, slices = candidate
+    replacement = bytearray()
+    for nalStart, nalEnd, header in slices:
+        renumbered = renumberSlice(sample[nalStart:nalEnd], header, *shifted(idrHeader["frameNum"], pocs[0]))
+        replacement += len(renumbered).to_bytes(lengthSize, "big") + renumbered
+    padding = sizes[start] - len(replacement)
+    if padding < 0 or 0 < padding < lengthSize + 2:
+        return None
+    if padding:
+        replacement += _fillerNal(padding, lengthSize)
+    return bytes(replacement), patches
+
+
+def _removeSyncSamples(outputPath, removed):
+    # drops sample indexes from the video track's stss box, chunk offsets are moved along when moov comes before mdat
+    with open(outputPath, "rb") as f:
+        moovPos, moovSize, fileSize = _locateMoov(f)
+        f.seek(moovPos)
+        moov = bytearray(f.read(moovSize))
+
+    tracks = {}
+    for boxType, boxStart, payloadStart, boxEnd, parents in _walkBoxes(moov, 0, len(moov)):
+        if len(parents) >= 2:
+            track = tracks.setdefault(parents[1], {})
+            if boxType == b"hdlr":
+                track["handler"] = moov[payloadStart + 8:payloadStart + 12]
+            elif boxType == b"stss":
+                track["stss"] = (boxStart, payloadStart, boxEnd, parents)
+    stss = next((track["stss"] for track in tracks.values() if track.get("handler") == b"vide" and "stss" in track), None)
+    if stss is None or not removed:
+        return
+
+    boxStart, payloadStart, boxEnd, parents = stss
+    count = struct.unpack(">I", moov[payloadStart + 4:payloadStart + 8])[0]
+    entries = struct.unpack(f">{count}I", moov[payloadStart + 8:payloadStart + 8 + 4 * count])
+    kept = [number for number in entries if number - 1 not in removed]
+    newBox = struct.pack(f">I4s4sI{len(kept)}I", 16 + 4 * len(kept), b"stss", bytes(moov[payloadStart:payloadStart + 4]), len(kept), *kept)
+    delta = len(newBox) - (boxEnd - boxStart)
+    moov[boxStart:boxEnd] = newBox
+
+    # every box around stss shrinks by the same amount
+    for parentStart in parents:
+        size = struct.unpack(">I", moov[parentStart:parentStart + 4])[0]
+        if size == 1:
+            largeSize = struct.unpack(">Q", moov[parentStart + 8:parentStart + 16])[0]
+            moov[parentStart + 8:parentStart + 16] = struct.pack(">Q", largeSize + delta)
+        else:
+            moov[parentStart:parentStart + 4] = struct.pack(">I", size + delta)
+
+    moovEnd = moovPos + moovSize
+    if moovEnd < fileSize:
+        # media data after moov moves by delta
+        for boxType, boxStart, payloadStart, boxEnd, parents in _walkBoxes(moov, 0, len(moov)):
+            if boxType not in (b"stco", b"co64"):
+                continue
+            width = 4 if boxType == b"stco" else 8
+            fmt = ">I" if width == 4 else ">Q"
+            count = struct.unpack(">I", moov[payloadStart + 4:payloadStart + 8])[0]
+            for entry in range(payloadStart + 8, payloadStart + 8 + width * count, width):
+                chunkOffset = struct.unpack(fmt, moov[entry:entry + width])[0]
+                if chunkOffset >= moovEnd:
+                    moov[entry:entry + width] = struct.pack(fmt, chunkOffset + delta)
+
+        tempPath = str(outputPath) + ".tmp"
+        with open(outputPath, "rb") as src, open(tempPath, "wb") as dst:
+            remaining = moovPos
+            while remaining:
+                chunk = src.read(min(remaining, 1 << 20))
+                dst.write(chunk)
+                remaining -= len(chunk)
+            dst.write(moov)
+            src.seek(moovEnd)
+            shutil.copyfileobj(src, dst)
+        os.replace(tempPath, outputPath)
+    else:
+        with open(outputPath, "r+b") as f:
+            f.seek(moovPos)
+            f.write(moov)
+            f.truncate()
@@ -1,4 +1,7 @@
 import random
+from io import BytesIO
+from PIL import Image
+from modules.BMP import maskBounds
 
 def findJpegHeaderEnd(filePath):
     with open(filePath, "rb") as f:
@@ -11,15 +14,8 @@ def findJpegHeaderEnd(filePath):
     return sosIndex + 2  # start after SOS marker
 
 
-def glitchJpeg(inputPath, outputPath, percent=5, seed=None, maxChunkLength=50):
-    if seed is not None:
-        random.seed(seed)
-
-    headerEnd = findJpegHeaderEnd(inputPath)
-
-    with open(inputPath, "rb") as f:
-        jpgBytes = bytearray(f.read())
-
+def glitchJpegBytes(jpgBytes, headerEnd, percent=5, maxChunkLength=50):
+    # corrupts a JPEG bytearray in place, everything before headerEnd is left alone
     length = len(jpgBytes) - headerEnd
     
     # dynamically set max chunk length based on frame size
@@ -42,7 +38,126 @@ def glitchJpeg(inputPath, outputPath, percent=5, seed=None, maxChunkLength=50):
         for i in range(chunkLen):
             if start + i < len(jpgBytes):
                 jpgBytes[start + i] = random.randint(0, 255)
+    return jpgBytes
+
+
+def glitchJpeg(inputPath, outputPath, percent=5, seed=None, maxChunkLength=50):
+    if seed is not None:
+        random.seed(seed)
+
+    headerEnd = findJpegHeaderEnd(inputPath)
+
+    with open(inputPath, "rb") as f:
+        jpgBytes = bytearray(f.read())
+
+    glitchJpegBytes(jpgBytes, headerEnd, percent=percent, maxChunkLength=maxChunkLength)
 
     # save the glitched JPEG
     with open(outputPath, "wb") as f:
         f.write(jpgBytes)
+
+
+def glitchFrameWithJPEG(frame, percent=5, maxChunkLength=50, quality=95, mask=None):
+    # JPEG-glitches a PIL image in memory, raises if the result can't be decoded
+    # with a mask only its bounding box is encoded and glitched, then pasted back through the mask
+    if mask is not None:
+        bounds = maskBounds(mask)
+        if bounds is None:
+            return frame.convert("RGB")
+        top, bottom, left, right = bounds
+        region = glitchFrameWithJPEG(frame.crop((left, top, right, bottom)), percent, maxChunkLength, quality)
+        result = frame.convert("RGB")
+        result.paste(region, (left, top), Image.fromarray(mask[top:bottom, left:right].astype("uint8") * 255))
+        return result
+
+    mem_file = BytesIO()
+    frame.save(mem_file, format="JPEG", quality=quality)
+    jpgBytes = bytearray(mem_file.getvalue())
+
+    headerEnd = jpgBytes.find(b"\xFF\xDA") + 2
+    glitchJpegBytes(jpgBytes, headerEnd, percent=percent, maxChunkLength=maxChunkLength)
+
+    # load glitched JPEG back into PIL and verify it can decode
+    glitchedImage = Image.open(BytesIO(jpgBytes))
+    glitchedImage.verify()  # verify it's valid
+    # reopen since verify() closes the image
+    glitchedImage = Image.open(BytesIO(jpgBytes))
+    return glitchedImage.convert("RGB")
+
+
+class AdaptiveIntensity:
+    # keeps the share of frames that are glitched beyond use under maxSkipRate
+    # a frame that can't be decoded is retried with half the corruption each time, up to maxAttempts tries,
+    # the last try is a single one-byte chunk that almost always decodes,
+    # and the next frame starts at the amount that decoded, creeping back up while first tries work
+    #
+    #   adaptive = AdaptiveIntensity(maxSkipRate=0.05)
+    #   glitchGifWithJPEG(inputGif, outputGif, percent=80, adaptive=adaptive)
+    #   adaptive.attempts  # tries spent on every frame
+
+    def __init__(self, maxSkipRate=0.05, maxAttempts=3):
+        self.maxSkipRate = maxSkipRate
+        self.maxAttempts = max(1, maxAttempts)
+        self.scale = 1.0
+        self.attempts = []
+        self.skipped = 0
+
+    def budget(self, percent, maxChunkLength, attempt):
+        # (percent, maxChunkLength) for the given try, counting from 0, each retry is half as strong
+        # and the last of several tries is the smallest glitch there is
+        if attempt > 0 and attempt == self.maxAttempts - 1:
+            return 1, 1
+        factor = 0.5 ** attempt
+        return max(1, round(percent * self.scale * factor)), max(1, round(maxChunkLength * factor))
+
+    def glitch(self, glitchOnce, percent, maxChunkLength):
+        # calls glitchOnce(percent, maxChunkLength) until it doesn't raise,
+        # returns its result or None when every try failed and the frame has to be skipped
+        for attempt in range(self.maxAttempts):
+            try:
+                result = glitchOnce(*self.budget(percent, maxChunkLength, attempt))
+            except Exception:
+                continue
+            self._record(attempt + 1, False)
+            return result
+        self._record(self.maxAttempts, True)
+        return None
+
+    def _record(self, attempts, skipped):
+        self.attempts.append(attempts)
+        self.skipped += skipped
+        if self.skipRate() > self.maxSkipRate:
+            # over the ceiling, start the next frames with half the iterations
+            self.scale = max(0.01, self.scale * 0.5)
+        elif attempts > 1:
+            # the first try was too strong, the next frame starts as strong as the try that decoded
+            # so a short clip doesn't spend its frames falling through to the last try
+            self.scale = max(0.01, self.scale * 0.5 ** (attempts - 1))
+        else:
+            # first try worked, creep back to the requested amount
+            self.scale = min(1.0, self.scale * 1.05)
+
+    def skipRate(self):
+        return self.skipped / len(self.attempts) if self.attempts else 0.0
+
+    def state(self):
+        # json-friendly state, lets a resumed job continue with the same controller
+        return {"scale": self.scale, "attempts": list(self.attempts), "skipped": self.skipped}
+
+    def restore(self, state):
+        self.scale = state["scale"]
+        self.attempts = list(state["attempts"])
+        self.skipped = state["skipped"]
+
+    def summary(self, percent=None):
+        frames = len(self.attempts)
+        total = sum(self.attempts)
+        text = (
+            f"Adaptive: {self.skipped}/{frames} frames skipped ({self.skipRate():.1%}, ceiling {self.maxSkipRate:.0%}), "
+            f"{total} attempts ({total / frames if frames else 0:.2f} per frame)")
+        if percent is not None:
+            text += f", amount ended at {max(1, round(percent * self.scale))}"
+        counts = [f"{tries} x{self.attempts.count(tries)}" for tries in range(1, self.maxAttempts + 1) if tries in self.attempts]
+        if counts:
+            text += f"\nAttempts per frame: {', '.join(counts)}"
+        return text
@@ -1,12 +1,47 @@
 import os
+import json
+import time
+import random
+import hashlib
 import shutil
 import subprocess
+from fractions import Fraction
+try:
+	import fcntl
+except ImportError:
+	# Windows has no fcntl, job locks go through msvcrt there
+	fcntl = None
+	import msvcrt
+from io import BytesIO
 from pathlib import Path
+import numpy as np
 import imageio.v2 as imageio
-import math
 import imageio_ffmpeg
-from modules.JPEG import glitchJpeg
-from modules.BMP import glitchFrame
+from PIL import Image
+from modules.JPEG import glitchJpeg, glitchJpegBytes, glitchFrameWithJPEG
+from modules.BMP import glitchFrame, buildMask
+from modules.H264 import glitchH264
+from modules.probe import probeMedia
+from modules.workspace import TempWorkspace, estimateFrameBytes
+
+
+# libx264 profiles for the names ffmpeg prints, used to encode spliced parts like the source
+_X264_PROFILES = {
+	"Constrained Baseline": "baseline",
+	"Baseline": "baseline",
+	"Main": "main",
+	"High": "high",
+	"High 10": "high10",
+	"High 4:2:2": "high422",
+	"High 4:4:4 Predictive": "high444",}
+_X264_PIXEL_FORMATS = ("yuv420p", "yuvj420p", "yuv422p", "yuvj422p", "yuv444p", "yuvj444p")
+
+# MP4 jobs save encoded segments here every segmentFrames frames so they can resume after a crash
+CHECKPOINT_ROOT = Path.home() / ".glitcher" / "checkpoints"
+CHECKPOINT_FILE = "checkpoint.json"
+# checkpoints nobody resumed are removed after this many days, oldest first past the size cap
+CHECKPOINT_MAX_AGE_DAYS = 14
+CHECKPOINT_MAX_BYTES = 4 * 1024 ** 3
 
 
 def _prepare_folder(folder):
@@ -15,107 +50,26 @@ def _prepare_folder(folder):
 	folder.mkdir(parents=True, exist_ok=True)
 
 
-def glitchMp4(
-	inputPath,
-	outputPath,
-	percent=10,
-	seed=None,
-	maxChunkLength=50,
-	progressCallback=None,
-	tempFolder="data/temp_frames",
-	glitchType="JPEG",):
-
-	tempFolder = Path(tempFolder)
-	extractedFolder = tempFolder / "extracted"
-	glitchedFolder = tempFolder / "glitched"
-
-	_prepare_folder(extractedFolder)
-	_prepare_folder(glitchedFolder)
-
-	reader = imageio.get_reader(str(inputPath), format="ffmpeg")
+def _replaceFile(sourcePath, outputPath):
 	try:
-		meta = reader.get_meta_data()
-		fps = meta.get("fps") or 24
-		nframes = meta.get("nframes")
-		duration = meta.get("duration")
-		total_frames = None
-		if isinstance(nframes, (int, float)) and nframes > 0 and math.isfinite(nframes):
-			total_frames = int(nframes)
-		elif isinstance(duration, (int, float)) and duration > 0 and math.isfinite(duration):
-			total_frames = int(round(duration * fps))
-		if not total_frames:
-			total_frames = 1
-
-		combined_total = total_frames * 3
-		if progressCallback is not None:
-			progressCallback(0, combined_total)
-
-		index = 0
-		for index, frame in enumerate(reader, start=1):
-			framePath = extractedFolder / f"frame_{index:06d}.jpg"
-			imageio.imwrite(framePath, frame)
-			if progressCallback is not None:
-				progressCallback(min(index, total_frames), combined_total)
+		if os.path.exists(outputPath):
+			os.remove(outputPath)
+		shutil.move(sourcePath, outputPath)
+	except Exception:
+		pass
 
-		# if the estimate was off, fix totals for later stages
-		total_frames = max(index, 1)
-		combined_total = total_frames * 3
-		if progressCallback is not None:
-			progressCallback(min(total_frames, total_frames), combined_total)
-	finally:
-		reader.close()
-
-	framePaths = sorted(extractedFolder.glob("frame_*.jpg"))
-	if not framePaths:
-		raise ValueError("No frames extracted from MP4.")
 
-	for index, framePath in enumerate(framePaths, start=1):
-		outputFrame = glitchedFolder / framePath.name
-		if glitchType == "BMP":
-			from PIL import Image
-			frame = Image.open(framePath).convert("RGB")
-			glitched = glitchFrame(frame, percent=percent)
-			glitched.save(outputFrame)
-		else:
-			frameSeed = None if seed is None else seed + index
-			glitchJpeg(
-				str(framePath),
-				str(outputFrame),
-				percent=percent,
-				seed=frameSeed,
-				maxChunkLength=maxChunkLength,
-			)
-		if progressCallback is not None:
-			progressCallback(total_frames + index, combined_total)
+def muxAudio(videoOnlyPath, inputPath, outputPath, hasAudio):
+	# copies the source audio next to the glitched video, falls back to video-only
+	if not hasAudio:
+		_replaceFile(videoOnlyPath, outputPath)
+		return "Audio: none"
 
-	outputPath = str(outputPath)
-	os.makedirs(os.path.dirname(outputPath) or ".", exist_ok=True)
-	video_only_path = os.path.splitext(outputPath)[0] + "_noaudio.mp4"
-	writer = imageio.get_writer(video_only_path, fps=fps, codec="libx264")
-	skipped_frames = 0
-	try:
-		for index, framePath in enumerate(sorted(glitchedFolder.glob("frame_*.jpg")), start=1):
-			try:
-				writer.append_data(imageio.imread(framePath))
-			except Exception:
-				# if a glitched frame is unreadable fall back to original
-				skipped_frames += 1
-				originalFrame = extractedFolder / framePath.name
-				writer.append_data(imageio.imread(originalFrame))
-			if progressCallback is not None:
-				progressCallback((total_frames * 2) + index, combined_total)
-	finally:
-		writer.close()
-
-	# preserves audio using ffmpeg
-	ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
-	muxed = False
-	audio_status = "Audio: none"
 	mux_cmd = [
-		ffmpeg_exe,
+		imageio_ffmpeg.get_ffmpeg_exe(),
 		"-y",
 		"-i",
-		str(video_only_path),
+		str(videoOnlyPath),
 		"-i",
 		str(inputPath),
 		"-c:v",
@@ -132,35 +86,586 @@ def glitchMp4(
 		str(outputPath),]
 	try:
 		mux_result = subprocess.run(mux_cmd, capture_output=True, check=False, text=True)
-		if mux_result.returncode == 0:
-			muxed = True
-			audio_status = "Audio: kept"
+	except Exception:
+		_replaceFile(videoOnlyPath, outputPath)
+		return "Audio: error"
+
+	if mux_result.returncode != 0:
+		_replaceFile(videoOnlyPath, outputPath)
+		return "Audio: failed"
+
+	try:
+		os.remove(videoOnlyPath)
+	except OSError:
+		pass
+	return "Audio: kept"
+
+
+def glitchMp4(
+	inputPath,
+	outputPath,
+	percent=10,
+	seed=None,
+	maxChunkLength=50,
+	progressCallback=None,
+	tempFolder=None,
+	glitchType="JPEG",
+	segmentFrames=250,
+	checkpointDir=None,
+	mask=None,
+	startTime=None,
+	endTime=None,
+	startFrame=None,
+	endFrame=None,
+	adaptive=None,):
+
+	# compressed-domain modes patch the bitstream and never touch the frame folders
+	if glitchType in ("H264", "Datamosh"):
+		corrupted, dropped, total_frames = glitchH264(
+			inputPath,
+			outputPath,
+			percent=percent,
+			seed=seed,
+			maxChunkLength=maxChunkLength,
+			dropKeyframes=glitchType == "Datamosh",
+			progressCallback=progressCallback,)
+		info = probeMedia(inputPath)
+		audio_status = "Audio: kept" if info["hasAudio"] else "Audio: none"
+		glitch_type_str = f"Glitch type: {glitchType} ({corrupted} frames corrupted, {dropped} keyframes dropped)"
+		return 0, total_frames, audio_status, glitch_type_str
+
+	# BMP frames never become unreadable, only JPEG glitching needs the skip-rate controller
+	if glitchType != "JPEG":
+		adaptive = None
+
+	info = probeMedia(inputPath)
+	fps = info["fps"] or 24
+	# a frame range is the same as a time range, endFrame is exclusive
+	if startFrame is not None:
+		startTime = startFrame / fps
+	if endFrame is not None:
+		endTime = endFrame / fps
+
+	if startTime is not None or endTime is not None:
+		# only the keyframe-aligned part around the range is decoded, the rest is stream-copied
+		rangeArgs = (inputPath, outputPath, percent, seed, maxChunkLength, progressCallback, glitchType, mask, startTime, endTime, adaptive)
+		if tempFolder is not None:
+			return _glitchMp4Range(*rangeArgs, Path(tempFolder))
+		rangeFrames = ((endTime or info["frames"] / fps) - (startTime or 0)) * fps
+		estimate = estimateFrameBytes(info["width"], info["height"], min(info["frames"], rangeFrames + segmentFrames))
+		with TempWorkspace(estimate) as workspace:
+			return _glitchMp4Range(*rangeArgs, workspace)
+
+	frameArgs = (inputPath, outputPath, percent, seed, maxChunkLength, progressCallback, glitchType, segmentFrames, checkpointDir, mask, adaptive)
+	if tempFolder is not None:
+		return _glitchMp4Frames(*frameArgs, Path(tempFolder))
+
+	# each job gets its own workspace, on tmpfs when one segment of frames fits the RAM budget
+	estimate = estimateFrameBytes(info["width"], info["height"], min(info["frames"], segmentFrames))
+	with TempWorkspace(estimate) as workspace:
+		return _glitchMp4Frames(*frameArgs, workspace)
+
+
+def _maskKey(mask):
+	# something json can hash that changes whenever the mask does
+	if mask is None:
+		return None
+	if isinstance(mask, np.ndarray):
+		return hashlib.sha1(np.packbits(mask.astype(bool)).tobytes()).hexdigest()
+	if isinstance(mask, (str, Path)):
+		return [str(Path(mask).resolve()), os.stat(mask).st_mtime_ns]
+	return [list(region) for region in mask]
+
+
+def _jobKey(inputPath, percent, seed, maxChunkLength, glitchType, segmentFrames, mask, adaptive=None):
+	# jobs with the same source file and parameters share a checkpoint
+	stat = os.stat(inputPath)
+	params = {
+		"input": str(Path(inputPath).resolve()),
+		"mtime": stat.st_mtime_ns,
+		"size": stat.st_size,
+		"percent": percent,
+		"seed": seed,
+		"maxChunkLength": maxChunkLength,
+		"glitchType": glitchType,
+		"segmentFrames": segmentFrames,
+		"mask": _maskKey(mask),}
+	if adaptive is not None:
+		# only added when set so older checkpoints keep their key
+		params["adaptive"] = [adaptive.maxSkipRate, adaptive.maxAttempts]
+	return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _loadCheckpoint(checkpointFolder):
+	# returns the saved state if every segment it lists is still there
+	try:
+		with open(checkpointFolder / CHECKPOINT_FILE) as f:
+			state = json.load(f)
+		if all((checkpointFolder / name).exists() for name in state["segments"]):
+			return state
+	except (OSError, ValueError, KeyError):
+		pass
+	return None
+
+
+def _saveCheckpoint(checkpointFolder, state):
+	# written to a temp file first so a crash never leaves a half-written checkpoint
+	tempPath = checkpointFolder / (CHECKPOINT_FILE + ".tmp")
+	with open(tempPath, "w") as f:
+		json.dump(state, f)
+	os.replace(tempPath, checkpointFolder / CHECKPOINT_FILE)
+
+
+class CheckpointLock:
+	# holds an OS lock on <checkpoint>.lock while a job uses the checkpoint folder,
+	# the OS drops it if the process dies so a crashed job never blocks the resume
+	#
+	#   with CheckpointLock(checkpointFolder):
+	#       ...
+
+	def __init__(self, checkpointFolder):
+		self.path = checkpointFolder.with_name(checkpointFolder.name + ".lock")
+		self.handle = None
+
+	def acquire(self):
+		# False if another live job holds the lock
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		handle = open(self.path, "a+b")
+		try:
+			if fcntl is not None:
+				fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+			else:
+				handle.seek(0)
+				msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+		except OSError:
+			handle.close()
+			return False
+		self.handle = handle
+		return True
+
+	def release(self):
+		if self.handle is None:
+			return
+		try:
+			if fcntl is not None:
+				fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+			else:
+				self.handle.seek(0)
+				msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+		except OSError:
+			pass
+		self.handle.close()
+		self.handle = None
+
+	def __enter__(self):
+		if not self.acquire():
+			raise RuntimeError("The same video is already being glitched with these settings, wait for that job to finish")
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.release()
+		return False
+
+
+def _folderBytes(folder):
+	total = 0
+	for path in folder.rglob("*"):
+		try:
+			if path.is_file():
+				total += path.stat().st_size
+		except OSError:
+			pass
+	return total
+
+
+def cleanCheckpoints(root=None, maxAgeDays=CHECKPOINT_MAX_AGE_DAYS, maxBytes=CHECKPOINT_MAX_BYTES):
+	# removes abandoned checkpoints: older than maxAgeDays, then the oldest until the rest fit in maxBytes
+	# folders locked by a running job are left alone, returns how many were removed
+	root = Path(root or CHECKPOINT_ROOT)
+	if not root.is_dir():
+		return 0
+
+	# finished jobs leave their empty lock file behind
+	for lockPath in root.glob("*.lock"):
+		lock = CheckpointLock(lockPath.with_suffix(""))
+		if lock.path.with_suffix("").exists() or not lock.acquire():
+			continue
+		lock.release()
+		try:
+			lockPath.unlink()
+		except OSError:
+			pass
+
+	checkpoints = []
+	for folder in root.iterdir():
+		if not folder.is_dir():
+			continue
+		lock = CheckpointLock(folder)
+		if not lock.acquire():
+			continue
+		try:
+			# the checkpoint file is rewritten after every segment, so its age is the last activity
+			stateFile = folder / CHECKPOINT_FILE
+			modified = (stateFile if stateFile.exists() else folder).stat().st_mtime
+		except OSError:
+			lock.release()
+			continue
+		checkpoints.append((modified, _folderBytes(folder), folder, lock))
+
+	removed = 0
+	checkpoints.sort(key=lambda item: item[0])
+	totalBytes = sum(size for _, size, _, _ in checkpoints)
+	oldest = time.time() - maxAgeDays * 86400
+	for modified, size, folder, lock in checkpoints:
+		if modified < oldest or totalBytes > maxBytes:
+			shutil.rmtree(folder, ignore_errors=True)
+			totalBytes -= size
+			removed += 1
+		lock.release()
+		if not folder.exists():
 			try:
-				os.remove(video_only_path)
+				lock.path.unlink()
 			except OSError:
 				pass
-		else:
-			audio_status = "Audio: failed"
-			# fall back to video-only
+	return removed
+
+
+def _encodeSegment(segmentPath, framePaths, extractedFolder, frameRate, writerOptions=None):
+	# encodes one segment at the exact frameRate (a Fraction), unreadable glitched frames fall back to the original frame
+	# writerOptions are passed on to imageio's ffmpeg writer
+	skipped = 0
+	partialPath = segmentPath.with_name(segmentPath.stem + "_partial.mp4")
+	options = dict(writerOptions or {})
+	# imageio passes fps rounded to two decimals, the exact rate given after it wins (ffmpeg warns about the repeat)
+	options["input_params"] = ["-r", str(frameRate)] + options.get("input_params", [])
+	options.setdefault("ffmpeg_log_level", "error")
+	writer = imageio.get_writer(str(partialPath), fps=float(frameRate), codec="libx264", **options)
+	try:
+		for framePath in framePaths:
 			try:
-				if os.path.exists(outputPath):
-					os.remove(outputPath)
-				shutil.move(video_only_path, outputPath)
+				writer.append_data(imageio.imread(framePath))
 			except Exception:
-				pass
-	except Exception as e:
-		audio_status = f"Audio: error"
-		# fall back to video-only
+				skipped += 1
+				writer.append_data(imageio.imread(extractedFolder / framePath.name))
+	finally:
+		writer.close()
+	os.replace(partialPath, segmentPath)
+	return skipped
+
+
+def _concatSegments(segmentPaths, listPath, outputPath):
+	# joins the encoded segments without re-encoding
+	with open(listPath, "w") as f:
+		for segmentPath in segmentPaths:
+			f.write(f"file '{Path(segmentPath).resolve().as_posix()}'\n")
+	concat_cmd = [
+		imageio_ffmpeg.get_ffmpeg_exe(),
+		"-v",
+		"error",
+		"-y",
+		"-f",
+		"concat",
+		"-safe",
+		"0",
+		"-i",
+		str(listPath),
+		"-c",
+		"copy",
+		str(outputPath),]
+	result = subprocess.run(concat_cmd, capture_output=True, check=False, text=True)
+	if result.returncode != 0:
+		raise RuntimeError(f"Joining video segments failed: {result.stderr.strip()}")
+
+
+def _glitchExtractedFrame(framePath, outputFrame, glitchType, percent, frameSeed, maxChunkLength, frameMask, adaptive=None):
+	# glitches one extracted JPEG frame into outputFrame, returns True if the original had to be kept
+	if glitchType == "BMP":
+		random.seed(frameSeed)
+		glitched = glitchFrame(Image.open(framePath).convert("RGB"), percent=percent, mask=frameMask)
+		glitched.save(outputFrame)
+	elif frameMask is not None:
+		# masked JPEG glitching works on the mask's bounding box in memory
+		random.seed(frameSeed)
+		image = Image.open(framePath).convert("RGB")
+		glitchOnce = lambda amount, chunkLength: glitchFrameWithJPEG(image, percent=amount, maxChunkLength=chunkLength, mask=frameMask)
 		try:
-			if os.path.exists(outputPath):
-				os.remove(outputPath)
-			shutil.move(video_only_path, outputPath)
+			glitched = glitchOnce(percent, maxChunkLength) if adaptive is None else adaptive.glitch(glitchOnce, percent, maxChunkLength)
 		except Exception:
-			pass
+			glitched = None
+		if glitched is None:
+			shutil.copyfile(framePath, outputFrame)
+			return True
+		glitched.save(outputFrame, quality=95)
+	elif adaptive is not None:
+		# each try glitches a fresh copy of the frame's bytes and has to decode before it's kept
+		random.seed(frameSeed)
+		with open(framePath, "rb") as f:
+			original = f.read()
+		headerEnd = original.find(b"\xFF\xDA") + 2
+
+		def glitchOnce(amount, chunkLength):
+			jpgBytes = glitchJpegBytes(bytearray(original), headerEnd, percent=amount, maxChunkLength=chunkLength)
+			Image.open(BytesIO(jpgBytes)).load()
+			return jpgBytes
+
+		jpgBytes = adaptive.glitch(glitchOnce, percent, maxChunkLength)
+		if jpgBytes is None:
+			shutil.copyfile(framePath, outputFrame)
+			return True
+		with open(outputFrame, "wb") as f:
+			f.write(jpgBytes)
+	else:
+		glitchJpeg(
+			str(framePath),
+			str(outputFrame),
+			percent=percent,
+			seed=frameSeed,
+			maxChunkLength=maxChunkLength,
+		)
+	return False
+
+
+def _glitchMp4Frames(inputPath, outputPath, percent, seed, maxChunkLength, progressCallback, glitchType, segmentFrames, checkpointDir, mask, adaptive, tempFolder):
+	# exact frame count and fps come from the cached probe instead of reader metadata
+	info = probeMedia(inputPath)
+
+	# encoded segments and progress survive crashes here, a rerun with the same parameters resumes
+	checkpointRoot = Path(checkpointDir or CHECKPOINT_ROOT)
+	checkpointFolder = checkpointRoot / _jobKey(inputPath, percent, seed, maxChunkLength, glitchType, segmentFrames, mask, adaptive)
+
+	# an identical job running at the same time would share the folder, so only one may hold it
+	with CheckpointLock(checkpointFolder):
+		cleanCheckpoints(checkpointRoot)
+		return _runMp4Frames(inputPath, outputPath, percent, seed, maxChunkLength, progressCallback, glitchType, segmentFrames, mask, adaptive, tempFolder, info, checkpointFolder)
+
+
+def _runMp4Frames(inputPath, outputPath, percent, seed, maxChunkLength, progressCallback, glitchType, segmentFrames, mask, adaptive, tempFolder, info, checkpointFolder):
+	extractedFolder = tempFolder / "extracted"
+	glitchedFolder = tempFolder / "glitched"
+	fps = info["fps"] or 24
+	frameRate = info["frameRate"] or Fraction(fps).limit_denominator(1001)
+	total_frames = max(info["frames"], 1)
+
+	state = _loadCheckpoint(checkpointFolder)
+	if state is None:
+		_prepare_folder(checkpointFolder)
+		# without a fixed seed one is picked per job and saved, so resumed frames match
+		jobSeed = seed if seed is not None else random.randrange(2 ** 32)
+		state = {"lastFrame": 0, "segments": [], "seed": jobSeed, "skipped": 0}
+		_saveCheckpoint(checkpointFolder, state)
+	elif adaptive is not None and "adaptive" in state:
+		# continue with the controller as it was at the last saved segment
+		adaptive.restore(state["adaptive"])
+	startFrame = state["lastFrame"]
+	if startFrame:
+		print(f"Resuming from frame {startFrame}/{total_frames}")
+
+	if progressCallback is not None:
+		progressCallback(startFrame, total_frames)
+
+	def finishSegment(lastIndex):
+		framePaths = sorted(glitchedFolder.glob("frame_*.jpg"))
+		if not framePaths:
+			return
+		segmentName = f"segment_{len(state['segments']):05d}.mp4"
+		state["skipped"] += _encodeSegment(checkpointFolder / segmentName, framePaths, extractedFolder, frameRate)
+		state["segments"].append(segmentName)
+		state["lastFrame"] = lastIndex
+		if adaptive is not None:
+			state["adaptive"] = adaptive.state()
+		_saveCheckpoint(checkpointFolder, state)
+
+	frameMask = buildMask((info["width"], info["height"]), mask)
+	_prepare_folder(extractedFolder)
+	_prepare_folder(glitchedFolder)
+	# the reader outputs frames on the grid of the exact probed rate, frame n sits at (n - 1) / frameRate
+	readerOptions = {"output_params": ["-r", str(frameRate)]}
+	# frames before the checkpoint were already encoded, ffmpeg seeks past them instead of decoding them here
+	# the seek stays on the grid but starts two frames early, the first frame after a seek can land a slot late
+	firstIndex = max(1, startFrame - 1)
+	if firstIndex > 1:
+		readerOptions["input_params"] = ["-ss", _seekTime((firstIndex - 1) / frameRate)]
+	reader = imageio.get_reader(str(inputPath), format="ffmpeg", **readerOptions)
+	try:
+		index = startFrame
+		for index, frame in enumerate(reader, start=firstIndex):
+			if index <= startFrame:
+				continue
+
+			framePath = extractedFolder / f"frame_{index:06d}.jpg"
+			outputFrame = glitchedFolder / framePath.name
+			imageio.imwrite(framePath, frame)
+			frameSeed = state["seed"] + index
+			if _glitchExtractedFrame(framePath, outputFrame, glitchType, percent, frameSeed, maxChunkLength, frameMask, adaptive):
+				state["skipped"] += 1
+
+			if index % segmentFrames == 0:
+				finishSegment(index)
+				_prepare_folder(extractedFolder)
+				_prepare_folder(glitchedFolder)
+			if progressCallback is not None:
+				progressCallback(min(index, total_frames), total_frames)
+		finishSegment(index)
+	finally:
+		reader.close()
+
+	if not state["segments"]:
+		raise ValueError("No frames extracted from MP4.")
 
+	# the decoder can still emit a different count than the container holds (e.g. edit lists)
+	total_frames = max(state["lastFrame"], 1)
+
+	outputPath = str(outputPath)
+	os.makedirs(os.path.dirname(outputPath) or ".", exist_ok=True)
+	video_only_path = os.path.splitext(outputPath)[0] + "_noaudio.mp4"
+	_concatSegments(
+		[checkpointFolder / name for name in state["segments"]],
+		tempFolder / "segments.txt",
+		video_only_path,)
+
+	# preserves audio using ffmpeg
+	audio_status = muxAudio(video_only_path, inputPath, outputPath, info["hasAudio"])
+
+	# the job is complete, its checkpoint is no longer needed
+	shutil.rmtree(checkpointFolder, ignore_errors=True)
+
+	skipped_frames = state["skipped"]
 	if skipped_frames:
 		print(f"{skipped_frames}/{total_frames} frames skipped (corrupted after glitch)")
 
 	glitch_type_str = f"Glitch type: {glitchType}"
+	if startFrame:
+		glitch_type_str += f" (resumed from frame {startFrame})"
+	if adaptive is not None:
+		glitch_type_str += "\n" + adaptive.summary(percent)
 	return skipped_frames, total_frames, audio_status, glitch_type_str
 
+
+def _seekTime(seconds):
+	# ffmpeg time string rounded down to whole microseconds, so it never passes an exact frame time
+	return f"{int(seconds * 1000000) / 1000000:.6f}"
+
+
+def _runFfmpeg(args, errorMessage):
+	cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-y"] + [str(arg) for arg in args]
+	result = subprocess.run(cmd, capture_output=True, check=False, text=True)
+	if result.returncode != 0:
+		raise RuntimeError(f"{errorMessage}: {result.stderr.strip()}")
+
+
+def _rangeBounds(keyframes, startTime, endTime, fps):
+	# widens [startTime, endTime) to the keyframes around it, None as end means "until the end of the video"
+	tolerance = 0.5 / fps
+	segStart = max([k for k in keyframes if k <= startTime + tolerance], default=0.0)
+	segEnd = min([k for k in keyframes if k > segStart and k >= endTime - tolerance], default=None)
+	return segStart, segEnd
+
+
+def _glitchMp4Range(inputPath, outputPath, percent, seed, maxChunkLength, progressCallback, glitchType, mask, startTime, endTime, adaptive, tempFolder):
+	info = probeMedia(inputPath)
+	if info["videoCodec"] != "h264":
+		raise ValueError(f"Time range glitching needs an H.264 video stream, found: {info['videoCodec']}")
+	fps = info["fps"] or 24
+	frameRate = info["frameRate"] or Fraction(fps).limit_denominator(1001)
+	duration = info["frames"] / fps
+	startTime = max(0.0, startTime or 0.0)
+	endTime = duration if endTime is None else min(endTime, duration)
+	if endTime <= startTime:
+		raise ValueError("End time must be after start time")
+	# the re-encoded part is spliced between stream-copied ones, so it has to match their format exactly
+	if info["pixelFormat"] not in _X264_PIXEL_FORMATS:
+		raise ValueError(f"Time range glitching can't re-encode {info['pixelFormat']} video, glitch the whole video instead")
+	writerOptions = {"macro_block_size": 1, "pixelformat": info["pixelFormat"]}
+	profile = _X264_PROFILES.get(info["videoProfile"])
+	if profile is not None:
+		writerOptions["output_params"] = ["-profile:v", profile]
+
+	segStart, segEnd = _rangeBounds(info["keyframes"] or [0.0], startTime, endTime, fps)
+
+	# cut the video stream at the two keyframes with stream copy, nothing is decoded here
+	cutTimes = [t for t in (segStart, segEnd) if t]
+	partsFolder = tempFolder / "parts"
+	_prepare_folder(partsFolder)
+	if cutTimes:
+		tolerance = 0.5 / fps
+		_runFfmpeg([
+			"-i", inputPath,
+			"-map", "0:v:0",
+			"-c", "copy",
+			"-f", "segment",
+			"-segment_times", ",".join(f"{t - tolerance:.6f}" for t in cutTimes),
+			"-segment_format", "mp4",
+			"-reset_timestamps", "1",
+			partsFolder / "part%03d.mp4",], "Splitting video failed")
+		parts = sorted(partsFolder.glob("part*.mp4"))
+		if len(parts) != len(cutTimes) + 1:
+			raise RuntimeError("Splitting video at keyframes failed")
+	else:
+		parts = [Path(inputPath)]
+	middleIndex = 1 if segStart else 0
+	middlePath = parts[middleIndex]
+
+	# decode, glitch and re-encode only the middle part
+	extractedFolder = tempFolder / "extracted"
+	glitchedFolder = tempFolder / "glitched"
+	_prepare_folder(extractedFolder)
+	_prepare_folder(glitchedFolder)
+	frameMask = buildMask((info["width"], info["height"]), mask)
+	jobSeed = seed if seed is not None else random.randrange(2 ** 32)
+	firstFrame = round(segStart * fps)
+	middleFrames = max(1, round(((segEnd or duration) - segStart) * fps))
+	tolerance = 0.5 / fps
+
+	skipped_frames = 0
+	glitched_frames = 0
+	reader = imageio.get_reader(str(middlePath), format="ffmpeg")
+	try:
+		for index, frame in enumerate(reader, start=1):
+			framePath = extractedFolder / f"frame_{index:06d}.jpg"
+			outputFrame = glitchedFolder / framePath.name
+			imageio.imwrite(framePath, frame)
+			frameTime = segStart + (index - 1) / fps
+			if startTime - tolerance <= frameTime < endTime - tolerance:
+				glitched_frames += 1
+				if _glitchExtractedFrame(framePath, outputFrame, glitchType, percent, jobSeed + firstFrame + index, maxChunkLength, frameMask, adaptive):
+					skipped_frames += 1
+			else:
+				# frames between the keyframe and the range start are re-encoded unglitched
+				shutil.copyfile(framePath, outputFrame)
+			if progressCallback is not None:
+				progressCallback(min(index, middleFrames), middleFrames)
+	finally:
+		reader.close()
+
+	middleEncoded = tempFolder / "middle.mp4"
+	skipped_frames += _encodeSegment(middleEncoded, sorted(glitchedFolder.glob("frame_*.jpg")), extractedFolder, frameRate, writerOptions)
+	parts[middleIndex] = middleEncoded
+
+	# parameter sets go in-band so the copied and re-encoded parts can share one stream
+	# the mp4 muxer would pick its own timescale per part, concat needs them all on the source's
+	timescaleArgs = []
+	if info["timeBase"] is not None and info["timeBase"].numerator == 1:
+		timescaleArgs = ["-video_track_timescale", info["timeBase"].denominator]
+	inBandParts = []
+	for number, part in enumerate(parts):
+		inBandPath = partsFolder / f"inband_{number:03d}.mp4"
+		_runFfmpeg(["-i", part, "-map", "0:v:0", "-c", "copy", "-bsf:v", "h264_mp4toannexb"] + timescaleArgs + [inBandPath], "Preparing video parts failed")
+		inBandParts.append(inBandPath)
+
+	outputPath = str(outputPath)
+	os.makedirs(os.path.dirname(outputPath) or ".", exist_ok=True)
+	video_only_path = os.path.splitext(outputPath)[0] + "_noaudio.mp4"
+	_concatSegments(inBandParts, tempFolder / "parts.txt", video_only_path)
+
+	# preserves audio using ffmpeg
+	audio_status = muxAudio(video_only_path, inputPath, outputPath, info["hasAudio"])
+
+	if skipped_frames:
+		print(f"{skipped_frames}/{glitched_frames} frames skipped (corrupted after glitch)")
+
+	glitch_type_str = (
+		f"Glitch type: {glitchType} ({startTime:.2f}s-{endTime:.2f}s, "
+		f"re-encoded {segStart:.2f}s-{(segEnd or duration):.2f}s, rest stream-copied)")
+	if adaptive is not None:
+		glitch_type_str += "\n" + adaptive.summary(percent)
+	return skipped_frames, glitched_frames, audio_status, glitch_type_str
@@ -0,0 +1,132 @@
+import random
+import struct
+import zlib
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IDAT_CHUNK_SIZE = 1 << 16
+
+# channels per pixel for each PNG color type
+_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# Adam7 passes as (x start, y start, x step, y step)
+_ADAM7 = [(0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2)]
+
+
+def _readChunks(file):
+    # yields (type, data) for every chunk without loading the whole file
+    while True:
+        header = file.read(8)
+        if len(header) < 8:
+            return
+        length, chunkType = struct.unpack(">I4s", header)
+        data = file.read(length)
+        file.read(4)  # crc, recomputed on write
+        yield chunkType, data
+        if chunkType == b"IEND":
+            return
+
+
+def _writeChunk(file, chunkType, data):
+    file.write(struct.pack(">I", len(data)))
+    file.write(chunkType)
+    file.write(data)
+    file.write(struct.pack(">I", zlib.crc32(chunkType + data) & 0xFFFFFFFF))
+
+
+def scanlineLengths(ihdr):
+    # byte length of every filtered scanline (filter byte included) in stream order
+    width, height, bitDepth, colorType, _, _, interlace = struct.unpack(">IIBBBBB", ihdr)
+    bitsPerPixel = _CHANNELS[colorType] * bitDepth
+    if interlace:
+        passes = []
+        for xStart, yStart, xStep, yStep in _ADAM7:
+            passWidth = (width - xStart + xStep - 1) // xStep
+            passHeight = (height - yStart + yStep - 1) // yStep
+            if passWidth > 0 and passHeight > 0:
+                passes.append((passWidth, passHeight))
+    else:
+        passes = [(width, height)]
+    for passWidth, passHeight in passes:
+        rowLength = 1 + (passWidth * bitsPerPixel + 7) // 8
+        for _ in range(passHeight):
+            yield rowLength
+
+
+def glitchScanline(row, percent=10, maxChunkLength=50):
+    # row[0] is the filter type, a wrong filter smears the row into everything below it
+    if random.random() < (percent / 100):
+        row[0] = random.randint(0, 4)
+    if len(row) > 1 and random.random() < (percent / 100):
+        start = random.randint(1, len(row) - 1)
+        chunkLen = min(random.randint(1, maxChunkLength), len(row) - start)
+        for i in range(chunkLen):
+            row[start + i] = random.randint(0, 255)
+    return row
+
+
+def glitchPng(inputPath, outputPath, percent=10, seed=None, maxChunkLength=50, progressCallback=None):
+    # streams IDAT data through zlib and glitches the filtered scanlines on the way,
+    # only a few scanlines are ever held in memory and the output stays a valid PNG
+    if seed is not None:
+        random.seed(seed)
+
+    with open(inputPath, "rb") as src, open(outputPath, "wb") as dst:
+        if src.read(8) != PNG_SIGNATURE:
+            raise ValueError("Not a PNG file")
+        dst.write(PNG_SIGNATURE)
+
+        rowLengths = iter(())
+        rowLength = None
+        totalRows = 0
+        rowIndex = 0
+        pending = bytearray()
+        compressed = bytearray()
+        decompressor = zlib.decompressobj()
+        compressor = zlib.compressobj(6)
+        inIdat = False
+
+        def processRows(final=False):
+            nonlocal rowIndex, rowLength
+            while rowLength is not None and len(pending) >= rowLength:
+                row = glitchScanline(bytearray(pending[:rowLength]), percent=percent, maxChunkLength=maxChunkLength)
+                del pending[:rowLength]
+                compressed.extend(compressor.compress(bytes(row)))
+                rowIndex += 1
+                rowLength = next(rowLengths, None)
+                if progressCallback is not None and (rowIndex % 64 == 0 or rowIndex == totalRows):
+                    progressCallback(rowIndex, totalRows)
+            if final:
+                compressed.extend(compressor.flush())
+            # emit full IDAT chunks as soon as there is enough compressed data
+            limit = 0 if final else IDAT_CHUNK_SIZE
+            while compressed and len(compressed) >= limit:
+                size = min(len(compressed), IDAT_CHUNK_SIZE)
+                _writeChunk(dst, b"IDAT", bytes(compressed[:size]))
+                del compressed[:size]
+
+        for chunkType, data in _readChunks(src):
+            if chunkType == b"IHDR":
+                rowLengths = scanlineLengths(data)
+                rowLength = next(rowLengths, None)
+                totalRows = sum(1 for _ in scanlineLengths(data))
+            if chunkType == b"IDAT":
+                inIdat = True
+                # bounded output per call keeps memory at a few scanlines for any image size
+                maxLength = max(IDAT_CHUNK_SIZE, (rowLength or 0) * 2)
+                data = decompressor.decompress(data, maxLength)
+                while True:
+                    pending.extend(data)
+                    processRows()
+                    if not decompressor.unconsumed_tail:
+                        break
+                    data = decompressor.decompress(decompressor.unconsumed_tail, maxLength)
+                continue
+
+            if inIdat:
+                # end of the IDAT run: drain zlib and write the remaining rows first
+                inIdat = False
+                pending.extend(decompressor.flush())
+                processRows(final=True)
+            _writeChunk(dst, chunkType, data)
+
+    return rowIndex, totalRows
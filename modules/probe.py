@@ -0,0 +1,158 @@
+import re
+import subprocess
+from collections import Counter
+from fractions import Fraction
+from pathlib import Path
+import imageio_ffmpeg
+
+
+# frame rates a coarse time base (e.g. milliseconds) is rounded back to
+_STANDARD_RATES = [Fraction(rate) for rate in (24, 25, 30, 48, 50, 60, 100, 120)] + [
+    Fraction(rate * 1000, 1001) for rate in (24, 30, 48, 60, 120)]
+
+# probe results keyed by resolved path, reused while the file's mtime and size are unchanged
+_probeCache = {}
+
+
+def probeMedia(path):
+    # reads dimensions, exact frame rate and count, keyframes, audio and codecs from one ffmpeg call
+    # the video stream is stream-copied into the framecrc muxer, so packets are demuxed but never decoded
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = str(path)
+    cached = _probeCache.get(key)
+    if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1]
+
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(),
+        "-hide_banner",
+        "-nostats",
+        "-i",
+        str(path),
+        "-map",
+        "0:v:0",
+        "-c",
+        "copy",
+        "-f",
+        "framecrc",
+        "-",]
+    result = subprocess.run(cmd, capture_output=True, check=False)
+    stdout = result.stdout.decode(errors="ignore")
+    stderr = result.stderr.decode(errors="ignore")
+    if result.returncode != 0:
+        raise ValueError(f"Could not probe media: {path.name}")
+
+    info = _parseProbe(stdout, stderr)
+    _probeCache[key] = ((stat.st_mtime_ns, stat.st_size), info)
+    return info
+
+
+def _parseProbe(stdout, stderr):
+    info = {
+        "width": None,
+        "height": None,
+        "fps": None,
+        "frameRate": None,
+        "timeBase": None,
+        "frames": 0,
+        "duration": None,
+        "hasAudio": False,
+        "videoCodec": None,
+        "videoProfile": None,
+        "pixelFormat": None,
+        "audioCodec": None,
+        "keyframes": [],}
+
+    # stream details come from the input summary ffmpeg prints on stderr
+    displayRates = []
+    inputSection = stderr.split("Output #0", 1)[0]
+    durationMatch = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", inputSection)
+    if durationMatch:
+        hours, minutes, seconds = durationMatch.groups()
+        info["duration"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    for line in inputSection.splitlines():
+        if "Stream #" not in line:
+            continue
+        if ": Video: " in line and info["videoCodec"] is None:
+            details = line.split(": Video: ", 1)[1]
+            info["videoCodec"] = details.split()[0].strip(",")
+            # "h264 (High) (avc1 / 0x31637661), yuv420p(progressive), ..." the codec tag is not a profile
+            profileMatch = re.match(r"\S+ \(([^)/]+)\)", details)
+            if profileMatch:
+                info["videoProfile"] = profileMatch.group(1)
+            fields = details.split(", ")
+            if len(fields) > 1:
+                info["pixelFormat"] = re.match(r"\w*", fields[1]).group(0) or None
+            # average rate and tbr (the base rate ffmpeg puts frames on), both rounded to two decimals
+            displayRates = [_parseRate(match) for match in re.findall(r"(\d+(?:\.\d+)?k?) (?:fps|tbr)", line)]
+            if displayRates:
+                info["fps"] = displayRates[0]
+        elif ": Audio: " in line and info["audioCodec"] is None:
+            info["hasAudio"] = True
+            info["audioCodec"] = line.split(": Audio: ", 1)[1].split()[0].strip(",")
+
+    # the framecrc header carries the exact dimensions and time base, then one line per packet
+    timeBase = Fraction(1, 1)
+    ptsList = []
+    keyPts = []
+    for line in stdout.splitlines():
+        if line.startswith("#tb"):
+            timeBase = Fraction(line.split(":", 1)[1].strip())
+        elif line.startswith("#dimensions"):
+            width, height = line.split(":", 1)[1].strip().split("x")
+            info["width"], info["height"] = int(width), int(height)
+        elif line and not line.startswith("#"):
+            fields = [field.strip() for field in line.split(",")]
+            pts = int(fields[2])
+            ptsList.append(pts)
+            # F= is only printed when the flags differ from a plain keyframe
+            flags = [int(field[2:], 16) for field in fields[6:] if field.startswith("F=")]
+            if not flags or flags[0] & 1:
+                keyPts.append(pts)
+
+    info["frames"] = len(ptsList)
+    info["timeBase"] = timeBase
+    if ptsList:
+        start = min(ptsList)
+        info["keyframes"] = sorted(float((pts - start) * timeBase) for pts in keyPts)
+    # stderr only prints the rate rounded ("29.97"), the packet timestamps pin down the exact one
+    info["frameRate"] = _exactRate(ptsList, timeBase, displayRates)
+    if info["frameRate"] is not None:
+        info["fps"] = float(info["frameRate"])
+    if not info["fps"] and info["frames"] and info["duration"]:
+        info["fps"] = info["frames"] / info["duration"]
+    if info["width"] is None or not info["frames"]:
+        raise ValueError("No video stream found")
+    return info
+
+
+def _exactRate(ptsList, timeBase, displayRates):
+    # the rate ffmpeg prints rounded to two decimals, as an exact Fraction
+    # standard rates first, then the most common frame step, then the average over the whole stream
+    ordered = sorted(set(ptsList))
+    candidates = list(_STANDARD_RATES)
+    if len(ordered) > 1:
+        steps = Counter(b - a for a, b in zip(ordered, ordered[1:]))
+        candidates.append(1 / (steps.most_common(1)[0][0] * timeBase))
+        candidates.append(Fraction(len(ordered) - 1) / ((ordered[-1] - ordered[0]) * timeBase))
+    if not displayRates:
+        return candidates[-1] if len(ordered) > 1 else None
+    for rate in candidates:
+        if any(abs(rate - Fraction(shown)) <= Fraction(51, 10000) for shown in displayRates):
+            return rate
+    return Fraction(displayRates[0]).limit_denominator(1001)
+
+
+def _parseRate(text):
+    if text.endswith("k"):
+        return float(text[:-1]) * 1000
+    return float(text)
+
+
+def clearProbeCache(path=None):
+    if path is None:
+        _probeCache.clear()
+    else:
+        _probeCache.pop(str(Path(path).resolve()), None)
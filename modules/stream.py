@@ -0,0 +1,189 @@
+import argparse
+import sys
+import threading
+import time
+from collections import deque
+import numpy as np
+from modules.BMP import glitchArray
+
+
+# frames waiting to be glitched, a full queue drops the oldest frame so latency stays bounded
+QUEUE_FRAMES = 2
+STATS_INTERVAL = 1.0
+
+
+def parseSize(text):
+    # "640x480" -> (640, 480)
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def _readFrame(inputStream, frameSize):
+    # reads exactly one frame, pipes can return less than asked for, None at end of stream
+    buffer = bytearray(frameSize)
+    view = memoryview(buffer)
+    got = 0
+    while got < frameSize:
+        count = inputStream.readinto(view[got:])
+        if not count:
+            return None
+        got += count
+    return buffer
+
+
+def streamGlitch(
+    inputStream,
+    outputStream,
+    width,
+    height,
+    fps,
+    percent=10,
+    maxShift=50,
+    budgetMs=None,
+    seed=None,
+    statsCallback=None,
+    statsInterval=STATS_INTERVAL,
+    queueFrames=QUEUE_FRAMES,):
+    # reads raw rgb24 frames from inputStream, glitches them and writes raw rgb24 frames to outputStream
+    # a frame that waited longer than budgetMs (one frame interval by default) is dropped instead of glitched,
+    # so when the glitching falls behind the output skips frames rather than lagging further and further
+    # returns the final stats dict, statsCallback gets the same dict every statsInterval seconds
+    frameSize = width * height * 3
+    budget = (budgetMs if budgetMs else 1000 / fps) / 1000
+    rng = np.random.default_rng(seed)
+
+    queue = deque()
+    ready = threading.Condition()
+    state = {"ended": False, "error": None}
+    stats = {
+        "read": 0,
+        "written": 0,
+        "dropped": 0,
+        "fps": 0.0,
+        "glitchMs": 0.0,
+        "latencyMs": 0.0,
+        "maxLatencyMs": 0.0,}
+
+    def reader():
+        try:
+            while True:
+                frame = _readFrame(inputStream, frameSize)
+                if frame is None:
+                    break
+                with ready:
+                    stats["read"] += 1
+                    if len(queue) >= queueFrames:
+                        queue.popleft()
+                        stats["dropped"] += 1
+                    queue.append((time.perf_counter(), frame))
+                    ready.notify()
+        except Exception as exc:
+            state["error"] = exc
+        finally:
+            with ready:
+                state["ended"] = True
+                ready.notify()
+
+    thread = threading.Thread(target=reader, name="glitcher-stream-reader", daemon=True)
+    thread.start()
+
+    started = time.perf_counter()
+    lastReport = started
+    lastWritten = 0
+    glitchTotal = 0.0
+    latencyTotal = 0.0
+    try:
+        while True:
+            with ready:
+                while not queue and not state["ended"]:
+                    ready.wait()
+                if not queue:
+                    break
+                arrived, frame = queue.popleft()
+
+            if time.perf_counter() - arrived > budget:
+                # already too old to be shown on time
+                with ready:
+                    stats["dropped"] += 1
+                continue
+
+            glitchStart = time.perf_counter()
+            glitchArray(np.frombuffer(frame, dtype=np.uint8).reshape(height, width, 3), percent=percent, maxShift=maxShift, rng=rng)
+            outputStream.write(frame)
+            outputStream.flush()
+            done = time.perf_counter()
+
+            glitchTotal += done - glitchStart
+            latencyTotal += done - arrived
+            stats["written"] += 1
+            stats["maxLatencyMs"] = max(stats["maxLatencyMs"], (done - arrived) * 1000)
+
+            if statsCallback is not None and done - lastReport >= statsInterval:
+                stats["fps"] = (stats["written"] - lastWritten) / (done - lastReport)
+                stats["glitchMs"] = glitchTotal / stats["written"] * 1000
+                stats["latencyMs"] = latencyTotal / stats["written"] * 1000
+                statsCallback(dict(stats))
+                lastReport = done
+                lastWritten = stats["written"]
+    except BrokenPipeError:
+        # the process reading the output went away, stop like ffmpeg does
+        pass
+
+    if state["error"] is not None:
+        raise state["error"]
+
+    elapsed = time.perf_counter() - started
+    if stats["written"]:
+        stats["fps"] = stats["written"] / elapsed if elapsed else 0.0
+        stats["glitchMs"] = glitchTotal / stats["written"] * 1000
+        stats["latencyMs"] = latencyTotal / stats["written"] * 1000
+    return stats
+
+
+def formatStats(stats):
+    return (
+        f"frames in: {stats['read']} out: {stats['written']} dropped: {stats['dropped']} | "
+        f"{stats['fps']:.1f} fps | glitch {stats['glitchMs']:.1f} ms | "
+        f"latency {stats['latencyMs']:.1f} ms (max {stats['maxLatencyMs']:.1f} ms)")
+
+
+def main(argv=None):
+    # example with an ffmpeg test source, stats go to stderr so stdout stays raw video:
+    #   ffmpeg -f lavfi -i testsrc2=size=640x480:rate=30 -f rawvideo -pix_fmt rgb24 - |
+    #   python -m modules.stream --size 640x480 --fps 30 --amount 10 |
+    #   ffplay -f rawvideo -pixel_format rgb24 -video_size 640x480 -framerate 30 -
+    parser = argparse.ArgumentParser(description="Glitch raw rgb24 video from stdin or a named pipe to stdout in real time.")
+    parser.add_argument("--size", required=True, help="frame size as WIDTHxHEIGHT")
+    parser.add_argument("--fps", type=float, required=True, help="input frame rate")
+    parser.add_argument("--amount", type=int, default=10, help="glitch amount (0-100)")
+    parser.add_argument("--input", default="-", help="named pipe or file to read from, - for stdin")
+    parser.add_argument("--budget", type=float, default=None, help="latency budget per frame in ms, default one frame interval")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--quiet", action="store_true", help="don't print live stats")
+    args = parser.parse_args(argv)
+
+    width, height = parseSize(args.size)
+    statsCallback = None
+    if not args.quiet:
+        statsCallback = lambda stats: print(formatStats(stats), file=sys.stderr, flush=True)
+
+    inputStream = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    try:
+        stats = streamGlitch(
+            inputStream,
+            sys.stdout.buffer,
+            width,
+            height,
+            args.fps,
+            percent=max(0, min(100, args.amount)),
+            budgetMs=args.budget,
+            seed=args.seed,
+            statsCallback=statsCallback,)
+    finally:
+        if inputStream is not sys.stdin.buffer:
+            inputStream.close()
+    print(formatStats(stats), file=sys.stderr, flush=True)
+
+
+if __name__ == "__main__":
+    main()
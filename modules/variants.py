@@ -0,0 +1,165 @@
+import math
+import random
+from pathlib import Path
+import numpy as np
+import imageio.v2 as imageio
+from PIL import Image, ImageDraw
+from modules.BMP import glitchFrame, buildMask
+from modules.JPEG import glitchFrameWithJPEG
+from modules.GIF import convertGIFtoBMPFrames
+from modules.MP4 import muxAudio
+from modules.probe import probeMedia
+
+
+# pixel engines that can share one decoded frame, compressed-domain types work on their own file
+VARIANT_TYPES = ("BMP", "JPEG")
+THUMBNAIL_WIDTH = 320
+
+
+def parseVariants(text):
+    # "JPEG:10, BMP:25:42" -> [("JPEG", 10, None), ("BMP", 25, 42)]
+    variants = []
+    for item in text.replace(";", ",").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        parts = [part.strip() for part in item.split(":")]
+        glitchType = parts[0].upper()
+        if glitchType not in VARIANT_TYPES or len(parts) not in (2, 3):
+            raise ValueError(f"Invalid variant '{item}', use TYPE:AMOUNT or TYPE:AMOUNT:SEED with TYPE one of {', '.join(VARIANT_TYPES)}")
+        amount = int(parts[1])
+        seed = int(parts[2]) if len(parts) == 3 else None
+        variants.append((glitchType, max(0, min(100, amount)), seed))
+    return variants
+
+
+def variantName(variant):
+    glitchType, amount, seed = variant
+    return f"{glitchType} {amount}" if seed is None else f"{glitchType} {amount} seed {seed}"
+
+
+def _glitchVariantFrame(frame, variant, index, maxChunkLength, mask):
+    # returns (glitched frame, skipped)
+    glitchType, amount, seed = variant
+    if seed is not None:
+        random.seed(seed + index)
+    if glitchType == "BMP":
+        return glitchFrame(frame, percent=amount, mask=mask), False
+    try:
+        return glitchFrameWithJPEG(frame, percent=amount, maxChunkLength=maxChunkLength, mask=mask), False
+    except Exception:
+        # unreadable after glitching, keep the original like the single-variant pipelines do
+        return frame, True
+
+
+def glitchVariants(inputPath, outputPaths, variants, contactSheetPath=None, maxChunkLength=50, progressCallback=None, mask=None):
+    # decodes the source once and feeds every frame to all variants, writing every output in one pass
+    # returns a list of (skipped frames, total frames), one entry per variant
+    if len(outputPaths) != len(variants):
+        raise ValueError("Need one output path per variant")
+
+    ext = Path(inputPath).suffix.lower()
+    if ext == ".gif":
+        return _glitchGifVariants(inputPath, outputPaths, variants, contactSheetPath, maxChunkLength, progressCallback, mask)
+    if ext == ".mp4":
+        return _glitchMp4Variants(inputPath, outputPaths, variants, contactSheetPath, maxChunkLength, progressCallback, mask)
+    raise ValueError(f"Variants need a GIF or MP4 source, got {ext}")
+
+
+def _glitchGifVariants(inputPath, outputPaths, variants, contactSheetPath, maxChunkLength, progressCallback, mask):
+    frames, durations, loop, disposal = convertGIFtoBMPFrames(str(inputPath))
+    mask = buildMask(frames[0].size, mask)
+    total = len(frames)
+    glitchedFrames = [[] for _ in variants]
+    skipped = [0] * len(variants)
+
+    for idx, frame in enumerate(frames, start=1):
+        for v, variant in enumerate(variants):
+            glitched, wasSkipped = _glitchVariantFrame(frame, variant, idx, maxChunkLength, mask)
+            glitchedFrames[v].append(glitched)
+            skipped[v] += wasSkipped
+        if progressCallback is not None:
+            progressCallback(idx, total)
+
+    for v, outputPath in enumerate(outputPaths):
+        glitchedFrames[v][0].save(
+            str(outputPath),
+            save_all=True,
+            append_images=glitchedFrames[v][1:],
+            loop=loop,
+            duration=durations,
+            disposal=disposal)
+
+    if contactSheetPath is not None:
+        middle = total // 2
+        saveContactSheet(contactSheetPath, frames[middle], [variantFrames[middle] for variantFrames in glitchedFrames], variants)
+
+    return [(count, total) for count in skipped]
+
+
+def _glitchMp4Variants(inputPath, outputPaths, variants, contactSheetPath, maxChunkLength, progressCallback, mask):
+    info = probeMedia(inputPath)
+    mask = buildMask((info["width"], info["height"]), mask)
+    fps = info["fps"] or 24
+    total = max(info["frames"], 1)
+    middle = (total + 1) // 2
+    skipped = [0] * len(variants)
+    sheetFrames = [None] * len(variants)
+    sheetOriginal = None
+
+    # full encodes would not fit a RAM-backed workspace, they go next to their outputs like glitchMp4's
+    videoOnlyPaths = [Path(outputPath).with_name(Path(outputPath).stem + "_noaudio.mp4") for outputPath in outputPaths]
+    try:
+        writers = [imageio.get_writer(str(path), fps=fps, codec="libx264") for path in videoOnlyPaths]
+        reader = imageio.get_reader(str(inputPath), format="ffmpeg")
+        try:
+            index = 0
+            for index, pixels in enumerate(reader, start=1):
+                frame = Image.fromarray(pixels)
+                for v, variant in enumerate(variants):
+                    glitched, wasSkipped = _glitchVariantFrame(frame, variant, index, maxChunkLength, mask)
+                    skipped[v] += wasSkipped
+                    writers[v].append_data(np.asarray(glitched))
+                    if index == middle:
+                        sheetFrames[v] = glitched
+                if index == middle:
+                    sheetOriginal = frame
+                if progressCallback is not None:
+                    progressCallback(min(index, total), total)
+            total = max(index, 1)
+        finally:
+            reader.close()
+            for writer in writers:
+                writer.close()
+
+        for videoOnlyPath, outputPath in zip(videoOnlyPaths, outputPaths):
+            muxAudio(str(videoOnlyPath), inputPath, str(outputPath), info["hasAudio"])
+    finally:
+        # muxing moves or removes each one, anything left is from a failed job
+        for videoOnlyPath in videoOnlyPaths:
+            if videoOnlyPath.exists():
+                videoOnlyPath.unlink()
+
+    if contactSheetPath is not None and sheetOriginal is not None:
+        saveContactSheet(contactSheetPath, sheetOriginal, sheetFrames, variants)
+
+    return [(count, total) for count in skipped]
+
+
+def saveContactSheet(outputPath, original, frames, variants):
+    # grid of one labelled thumbnail per variant, the original comes first
+    cells = [(original, "original")] + [(frame, variantName(variant)) for frame, variant in zip(frames, variants)]
+    columns = math.ceil(math.sqrt(len(cells)))
+    rows = math.ceil(len(cells) / columns)
+    thumbHeight = max(1, round(original.height * THUMBNAIL_WIDTH / original.width))
+    labelHeight = 16
+
+    sheet = Image.new("RGB", (columns * THUMBNAIL_WIDTH, rows * (thumbHeight + labelHeight)), "black")
+    draw = ImageDraw.Draw(sheet)
+    for cell, (frame, label) in enumerate(cells):
+        x = (cell % columns) * THUMBNAIL_WIDTH
+        y = (cell // columns) * (thumbHeight + labelHeight)
+        sheet.paste(frame.convert("RGB").resize((THUMBNAIL_WIDTH, thumbHeight)), (x, y))
+        draw.text((x + 4, y + thumbHeight + 2), label, fill="white")
+    sheet.save(str(outputPath))
+    return outputPath
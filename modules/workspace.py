@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+
+# how much frame data may go to RAM-backed storage, override with GLITCHER_RAM_BUDGET_MB
+DEFAULT_RAM_BUDGET = int(os.environ.get("GLITCHER_RAM_BUDGET_MB", "1024")) * 1024 * 1024
+
+# tmpfs mounts tried before falling back to the regular temp folder
+_RAM_DIRS = ["/dev/shm", os.environ.get("XDG_RUNTIME_DIR", "")]
+
+
+def estimateFrameBytes(width, height, frames, copies=2):
+    # upper bound for extracted frames on disk: raw RGB size for every copy of every frame
+    return int(width) * int(height) * 3 * int(frames) * copies
+
+
+def _hasRoom(folder, neededBytes):
+    try:
+        return os.access(folder, os.W_OK) and shutil.disk_usage(folder).free > neededBytes
+    except OSError:
+        return False
+
+
+def pickTempRoot(estimatedBytes=0, ramBudget=None):
+    # tmpfs when the job fits the RAM budget, the system temp folder otherwise
+    if ramBudget is None:
+        ramBudget = DEFAULT_RAM_BUDGET
+    if estimatedBytes <= ramBudget:
+        for folder in _RAM_DIRS:
+            if folder and os.path.isdir(folder) and _hasRoom(folder, estimatedBytes):
+                return Path(folder)
+    return Path(tempfile.gettempdir())
+
+
+class TempWorkspace:
+    # a unique folder per job, removed on exit even if the job raised
+    #
+    #   with TempWorkspace(estimatedBytes) as folder:
+    #       ...
+
+    def __init__(self, estimatedBytes=0, ramBudget=None, prefix="glitcher_"):
+        self.estimatedBytes = estimatedBytes
+        self.ramBudget = ramBudget
+        self.prefix = prefix
+        self.path = None
+
+    def create(self):
+        root = pickTempRoot(self.estimatedBytes, self.ramBudget)
+        self.path = Path(tempfile.mkdtemp(prefix=self.prefix, dir=str(root)))
+        return self.path
+
+    def cleanup(self):
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+
+    def __enter__(self):
+        return self.create()
+
+    def __exit__(self, excType, excValue, traceback):
+        self.cleanup()
+        return False